@@ -1,12 +1,13 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 
-from core.block import Block
+from core.admission import check_admission
 from core.mempool import Mempool
-from core.state import compute_balances, compute_nonces, compute_pools
+from core.network import BLOCKS_PER_PAGE
+from core.snapshot import SnapshotStore
 from core.storage import ChainStorage
-from core.tx_engine import TransactionEngine, is_canonical_amount
-from core.utils import canonical_tx, get_protocol
+from core.sender_recovery import SenderRecovery
+from core.tx_engine import TransactionEngine, is_canonical_amount, signed_message
 
 import uuid
 import time
@@ -47,6 +48,18 @@ app.add_middleware(
 )
 
 storage = ChainStorage()
+snapshots = SnapshotStore(storage)
+recovery = SenderRecovery()
+tx_engine = TransactionEngine(recovery=recovery)
+
+def load_protocol():
+    genesis = storage.get_block(0)
+    return genesis.get("protocol") if genesis else None
+
+def load_state(protocol):
+    """Tip state from the newest snapshot plus the blocks after it"""
+    state, _ = snapshots.restore(protocol)
+    return state
 
 @app.get("/health")
 def health():
@@ -58,23 +71,39 @@ def get_chain():
 
 @app.get("/chain/latest")
 def get_latest_block():
-    chain = storage.load()
-    if not chain:
+    height = storage.height()
+    if not height:
         return None
-    return chain[-1]
+    return storage.get_block(height - 1)
+
+@app.get("/chain/block/{index}")
+def get_block(index: int):
+    return storage.get_block(index)
+
+@app.get("/chain/hash/{block_hash}")
+def get_block_by_hash(block_hash: str):
+    return storage.get_by_hash(block_hash)
+
+@app.get("/chain/range")
+def get_block_range(start: int, end: int):
+    if start < 0 or end < start:
+        raise HTTPException(status_code=400, detail="Invalid range")
+    if end - start > BLOCKS_PER_PAGE:  # end is exclusive
+        raise HTTPException(status_code=400, detail=f"At most {BLOCKS_PER_PAGE} blocks per range")
+    return storage.get_range(start, end)
 
 @app.get("/treasury")
 def get_treasury():
-    chain = storage.load()
-    protocol = get_protocol(chain)
-    
-    balances = compute_balances(chain, protocol)
+    protocol = load_protocol()
+
+    state, tip = snapshots.restore(protocol)
+    balances = state["balances"]
     treasury_key = f"{protocol['treasury'].lower()}:{protocol['native_asset']}"
     treasury_balance = balances.get(treasury_key, 0)
     
     return {
         "treasury": treasury_balance,
-        "block": len(chain) - 1 if chain else 0
+        "block": max(tip, 0)
     }
 
 @app.get("/nonce/{address}")
@@ -97,28 +126,16 @@ def get_nonce(address: str):
 
 @app.post("/tx/send")
 async def send_tx(payload: dict):
-    mempool = Mempool()
-    storage = ChainStorage()
-
-    chain = storage.load()
-    protocol = get_protocol(chain)
+    mempool = Mempool(owner=False)
+    protocol = load_protocol()
 
     tx = payload["tx"]
     signature = payload["signature"]
 
-    signed_payload = {
-        key: tx[key]
-        for key in ("txid", "action", "asset", "amount", "to", "nonce", "chainId")
-        if key in tx
-    }
-
-    message = canonical_tx(signed_payload)
+    message = signed_message(tx)
 
     try:
-        recovered = Account.recover_message(
-            encode_defunct(text=message),
-            signature=signature
-        )
+        recovered = await recovery.recover_one(message, signature)
     except Exception:
         return {"ok": False, "error": "Invalid signature format"}
 
@@ -147,16 +164,22 @@ async def send_tx(payload: dict):
     if tx.get("amount", 0) <= 0:
         return {"ok": False, "error": "Invalid amount"}
 
-    # NONCE CHECK
-    expected_nonce = compute_nonces(chain).get(sender, 0)
-
-    if tx.get("nonce") != expected_nonce:
-        return {"ok": False, "error": f"Invalid nonce. Expected {expected_nonce}"}
-
     # BASIC ACTION CHECK
     if tx.get("action") not in ("transfer", "add_liquidity"):
         return {"ok": False, "error": "Unsupported action"}
 
+    # ADMISSION: nonce, funds and signature against tip + pending txs
+    try:
+        check_admission(
+            tx,
+            load_state(protocol)["balances"],
+            mempool.sender_queue(sender),
+            protocol,
+            tx_engine
+        )
+    except ValueError as e:
+        return {"ok": False, "error": str(e)}
+
     # ADD TO MEMPOOL
     added = mempool.add(tx)
     if not added:
@@ -170,30 +193,18 @@ async def send_tx(payload: dict):
 
 @app.post("/tx/mint")
 async def send_mint_tx(payload: dict):
-    mempool = Mempool()
-    storage = ChainStorage()
-
-    chain = storage.load()
-    protocol = get_protocol(chain)
+    mempool = Mempool(owner=False)
+    protocol = load_protocol()
 
     tx = payload["tx"]
     tx["action"] = "mint_bridge"
     signature = payload["signature"]
 
     # Build canonical payload
-    signed_payload = {
-        key: tx[key]
-        for key in ("txid", "action", "asset", "amount", "to", "nonce", "chainId")
-        if key in tx
-    }
-
-    message = canonical_tx(signed_payload)
+    message = signed_message(tx)
 
     try:
-        recovered = Account.recover_message(
-            encode_defunct(text=message),
-            signature=signature
-        )
+        recovered = await recovery.recover_one(message, signature)
     except Exception:
         return {"ok": False, "error": "Invalid signature format"}
 
@@ -223,12 +234,6 @@ async def send_mint_tx(payload: dict):
     if not is_canonical_amount(tx["amount"]):
         return {"ok": False, "error": "Non canonical amount"}
 
-    # nonce check
-    expected_nonce = compute_nonces(chain).get(sender, 0)
-
-    if tx.get("nonce") != expected_nonce:
-        return {"ok": False, "error": f"Invalid nonce. Expected {expected_nonce}"}
-
     # Complete tx
     tx["sender"] = sender.lower()
     tx["timestamp"] = int(time.time())
@@ -243,6 +248,18 @@ async def send_mint_tx(payload: dict):
     if "to" in tx:
         tx["to"] = tx["to"].lower()
 
+    # ADMISSION: nonce and signature against tip + pending txs
+    try:
+        check_admission(
+            tx,
+            load_state(protocol)["balances"],
+            mempool.sender_queue(sender),
+            protocol,
+            tx_engine
+        )
+    except ValueError as e:
+        return {"ok": False, "error": str(e)}
+
     # Add to mempool
     added = mempool.add(tx)
 
@@ -257,17 +274,18 @@ async def send_mint_tx(payload: dict):
 
 @app.get("/pools")
 def get_pools():
-    chain = storage.load()
-    chain = [Block.from_dict(b) for b in chain]
-    return compute_pools(chain)
+    protocol = load_protocol()
+    if not protocol:
+        return []
+    return list(load_state(protocol)["pools"].values())
 
 @app.get("/market/stats")
 def get_market_stats():
-    chain = storage.load()
+    height = storage.height()
 
-    protocol = get_protocol(chain)
+    protocol = load_protocol()
     
-    if not chain:
+    if not height:
         return {
             "price_usd": 0,
             "total_supply": 0,
@@ -278,7 +296,7 @@ def get_market_stats():
             "pool_liquidity_usd": 0
         }
     
-    balances = compute_balances(chain, protocol)
+    balances = load_state(protocol)["balances"]
     native = protocol["native_asset"]
     treasury_addr = protocol["treasury"].lower()
 
@@ -291,7 +309,7 @@ def get_market_stats():
     circulating_supply = total_supply - treasury
     
     # Find pools
-    pools = chain[-1].get("pools", [])
+    pools = storage.get_block(height - 1).get("pools", [])
     main_pool = next((p for p in pools if p["id"] == "aUSD-ARGH"), None)
     
     if main_pool:
@@ -376,11 +394,9 @@ def tx_history(address: str):
 @app.get("/tx/pending/{address}")
 def tx_pending(address: str):
     address = norm(address)
-    mempool = Mempool()
-    storage = ChainStorage()
+    mempool = Mempool(owner=False)
 
-    chain = storage.load()
-    protocol = get_protocol(chain)
+    protocol = load_protocol()
     native = protocol["native_asset"]
 
     txs = []
@@ -497,15 +513,12 @@ def verify(payload: dict):
 @app.get("/balance/{address}")
 def get_balance(address: str):
     address = norm(address)
-    chain = storage.load()
 
-    protocol = get_protocol(chain)
+    protocol = load_protocol()
     if not protocol:
         raise ValueError("Missing protocol state")
 
-    from core.state import compute_balances
-
-    balances = compute_balances(chain, protocol)
+    balances = load_state(protocol)["balances"]
     user_balances = {}
 
     for key, value in balances.items():
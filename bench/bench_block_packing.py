@@ -0,0 +1,135 @@
+# bench/bench_block_packing.py
+"""
+Txs per block for one busy account.
+
+  python bench/bench_block_packing.py [--busy 50] [--others 20] [--blocks 5]
+
+One account submits nonces 0..busy-1 with random txids, next to `others`
+accounts with a single tx each. Both packers fill blocks until the busy
+account's queue is empty (or `--blocks` is reached).
+
+"before": mempool sorted by txid, every nonce mismatch discarded (old path).
+"after":  pack_user_txs, per-sender nonce order, future nonces held back.
+"""
+import argparse
+import asyncio
+import sys
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from eth_account import Account
+from eth_account.messages import encode_defunct
+
+from core import genesis
+from core.block_builder import pack_user_txs, with_fee
+from core.tx_engine import TransactionEngine, k, signed_message
+from core.utils import q
+
+
+def load_protocol():
+    chain = []
+
+    class Offline:
+        peers = {}
+
+        def save(self, chain):
+            pass
+
+    genesis.generate(chain, Offline(), Offline())
+    return chain[0].protocol
+
+
+def make_tx(account, nonce, protocol):
+    tx = {
+        "txid": uuid.uuid4().hex,
+        "action": "transfer",
+        "asset": protocol["native_asset"],
+        "amount": q(1),
+        "to": "0x" + "ab" * 20,
+        "nonce": nonce,
+        "chainId": protocol["chain_id"],
+    }
+    signed = Account.sign_message(
+        encode_defunct(text=signed_message(tx)),
+        private_key=account.key
+    )
+    tx["sender"] = account.address
+    tx["_meta"] = {"sender": account.address, "signature": signed.signature.hex()}
+    return tx
+
+
+def funded_balances(accounts, protocol):
+    return {k(a.address, protocol["native_asset"]): q(1_000_000) for a in accounts}
+
+
+async def before(mempool, balances, protocol, tx_engine):
+    valid, invalid = [], set()
+
+    for tx in sorted(mempool, key=lambda x: x["txid"]):
+        try:
+            tx_engine.validate(tx, balances, protocol)
+            txc = with_fee(tx, protocol)
+            valid.append(txc)
+            tx_engine.apply_tx(balances, txc, system=False, validator_address=None, protocol=protocol)
+        except ValueError:
+            invalid.add(tx["txid"])
+
+    return valid, invalid
+
+
+async def after(mempool, balances, protocol, tx_engine):
+    return await pack_user_txs(mempool, balances, protocol, tx_engine)
+
+
+def run(packer, txs, accounts, busy, protocol, max_blocks):
+    tx_engine = TransactionEngine()
+    balances = funded_balances(accounts, protocol)
+    mempool = list(txs)
+    per_block = []
+    discarded = 0
+
+    for _ in range(max_blocks):
+        valid, invalid = asyncio.run(packer(mempool, balances, protocol, tx_engine))
+
+        landed = sum(1 for tx in valid if tx["sender"] == busy.address)
+        discarded += sum(1 for tx in mempool if tx["txid"] in invalid and tx["sender"] == busy.address)
+        per_block.append(landed)
+
+        gone = invalid | {tx["txid"] for tx in valid}
+        mempool = [tx for tx in mempool if tx["txid"] not in gone]
+
+        if not any(tx["sender"] == busy.address for tx in mempool):
+            break
+
+    return per_block, discarded
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--busy", type=int, default=50)
+    parser.add_argument("--others", type=int, default=20)
+    parser.add_argument("--blocks", type=int, default=5)
+    args = parser.parse_args()
+
+    protocol = load_protocol()
+
+    busy = Account.create()
+    others = [Account.create() for _ in range(args.others)]
+
+    txs = [make_tx(busy, nonce, protocol) for nonce in range(args.busy)]
+    txs += [make_tx(account, 0, protocol) for account in others]
+
+    print(f"busy account: {args.busy} txs (nonces 0..{args.busy - 1}), {args.others} other senders")
+
+    for name, packer in (("before", before), ("after", after)):
+        per_block, discarded = run(packer, txs, [busy] + others, busy, protocol, args.blocks)
+        print(
+            f"{name + ':':8}busy txs per block {per_block}, "
+            f"landed {sum(per_block)}/{args.busy}, discarded {discarded}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# bench/bench_loop_stall.py
+"""
+Event loop stalls while 200-block sync pages are received.
+
+  python bench/bench_loop_stall.py [--pages 10] [--peers 2] [--txs-per-block 20]
+
+Every peer's reader gets `pages` frames; a LoopMonitor measures how
+long the loop was held at a time meanwhile.
+
+"inline":    frame decoded and its blocks parsed on the loop (old path)
+"offloaded": read_message(), large frames go to the decode pool
+"""
+import argparse
+import asyncio
+import random
+import struct
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench_wire import make_chain, address
+from core import wire
+from core.loop_monitor import LoopMonitor
+from core.network import MAX_MSG_SIZE, P2PNetwork, decode_frame
+
+MODES = {
+    "json": frozenset(),
+    "bin+z": frozenset({"bin", "zlib"}),
+}
+
+
+async def read_inline(reader):
+    header = await reader.readexactly(4)
+    size = struct.unpack(">I", header)[0]
+    payload = await reader.readexactly(size)
+    return decode_frame(payload, MAX_MSG_SIZE)
+
+
+async def receive(read, frame, pages):
+    reader = asyncio.StreamReader(limit=MAX_MSG_SIZE)
+    reader.feed_data(frame * pages)
+    reader.feed_eof()
+
+    for _ in range(pages):
+        msg = await read(reader)
+        assert not msg["error"] and len(msg["data"]) == 200
+        await asyncio.sleep(0.001)  # a socket yields between frames
+
+
+async def run(path, frame, pages, peers):
+    network = P2PNetwork("bench", [], None, None, None)
+    read = read_inline if path == "inline" else network.read_message
+
+    await receive(read, frame, 1)  # starts the decode pool
+
+    monitor = LoopMonitor(interval=0.001)
+    monitor.start()
+    await asyncio.sleep(0.01)
+    monitor.reset()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(receive(read, frame, pages) for _ in range(peers)))
+    elapsed = time.perf_counter() - started
+
+    await asyncio.sleep(0.01)  # the last probe records its lateness
+    monitor.stop()
+    if network.decoder:
+        network.decoder.shutdown()
+    return monitor.take(), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--peers", type=int, default=2)
+    parser.add_argument("--txs-per-block", type=int, default=20)
+    args = parser.parse_args()
+
+    random.seed(1)
+    senders = [address() for _ in range(50)]
+    chain = make_chain(200, args.txs_per_block, senders)
+    page = {"type": "blocks", "from": 1, "data": [b.to_dict() for b in chain]}
+
+    print(f"{args.peers} peers x {args.pages} pages of 200 blocks, {args.txs_per_block} txs per block")
+    print(f"{'mode':<8}{'path':<11}{'frame':>11}{'max stall':>12}{'over 50ms':>11}{'pages/s':>10}")
+
+    for mode, features in MODES.items():
+        frame = wire.encode_frame(page, features)
+
+        for path in ("inline", "offloaded"):
+            stats, elapsed = asyncio.run(run(path, frame, args.pages, args.peers))
+            print(
+                f"{mode:<8}{path:<11}{len(frame):>11,}{stats['max_stall_ms']:>10.1f}ms"
+                f"{stats['stalls']:>11}{args.pages * args.peers / elapsed:>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
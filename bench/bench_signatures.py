@@ -0,0 +1,88 @@
+# bench/bench_signatures.py
+"""
+Block signature verification throughput for sync pages.
+
+  python bench/bench_signatures.py [--pages 20] [--page-size 200]
+
+"before": a new VerifyKey per block, verified one at a time (old path).
+"after":  cached VerifyKeys, page verified in the process pool up front,
+          then consumed in order the way on_blocks does.
+"""
+import argparse
+import asyncio
+import hashlib
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from nacl.encoding import RawEncoder
+from nacl.exceptions import BadSignatureError
+from nacl.signing import SigningKey, VerifyKey
+
+from core.signature_verifier import SignatureVerifier
+
+
+def make_pages(pages, page_size, validators=4):
+    keys = [SigningKey.generate() for _ in range(validators)]
+    result = []
+    for p in range(pages):
+        page = []
+        for i in range(page_size):
+            sk = keys[(p * page_size + i) % validators]
+            message = hashlib.sha256(f"{p}:{i}".encode()).hexdigest().encode()
+            signature = sk.sign(message).signature
+            page.append((sk.verify_key.encode(), message, signature))
+        result.append(page)
+    return result
+
+
+def before(pages):
+    for page in pages:
+        for pubkey, message, signature in page:
+            try:
+                VerifyKey(pubkey, encoder=RawEncoder).verify(message, signature)
+            except BadSignatureError:
+                pass
+
+
+async def after(pages):
+    verifier = SignatureVerifier()
+    # warm the pool so worker start-up is not billed to the first page
+    await verifier.preverify(pages[0])
+    verifier.clear()
+
+    started = time.perf_counter()
+    for page in pages:
+        await verifier.preverify(page)
+        for item in page:
+            verifier.verify(*item)
+        verifier.clear()
+    elapsed = time.perf_counter() - started
+
+    verifier.executor.shutdown()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--page-size", type=int, default=200)
+    args = parser.parse_args()
+
+    pages = make_pages(args.pages, args.page_size)
+
+    started = time.perf_counter()
+    before(pages)
+    t_before = time.perf_counter() - started
+
+    t_after = asyncio.run(after(pages))
+
+    print(f"pages: {args.pages} x {args.page_size} signatures")
+    print(f"before: {args.pages / t_before:8.1f} pages/s  ({t_before:.3f}s)")
+    print(f"after:  {args.pages / t_after:8.1f} pages/s  ({t_after:.3f}s)")
+
+
+if __name__ == "__main__":
+    main()
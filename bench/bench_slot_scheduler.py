@@ -0,0 +1,134 @@
+# bench/bench_slot_scheduler.py
+"""
+Wakeups and CPU of the slot loop on a node that is not the leader.
+
+  python bench/bench_slot_scheduler.py [--slots 5] [--slot-duration 2]
+
+A simulated peer appends the block of every slot shortly after it starts.
+"before": the old main loop (asyncio.sleep(0) spin while the tip is at
+          the current slot, fixed sleeps otherwise).
+"after":  timers at slot start / deadlines plus block-arrival events.
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from core.network import P2PNetwork
+
+ARRIVAL_DELAY = 0.2  # seconds after slot start the leader's block shows up
+
+
+class FakeBlock:
+    def __init__(self, slot):
+        self.slot = slot
+        self.hash = f"{slot:064x}"
+
+
+def current_slot(duration):
+    return int(time.time() // duration)
+
+
+async def produce(p2p, duration, end):
+    """Peer side: the slot's block arrives ARRIVAL_DELAY after slot start"""
+    while time.time() < end:
+        slot = current_slot(duration) + 1
+        await asyncio.sleep(max(0, slot * duration + ARRIVAL_DELAY - time.time()))
+        p2p.chain.append(FakeBlock(slot))
+        p2p.chain_changed()
+
+
+async def before(p2p, duration, tolerance, end):
+    chain = p2p.chain
+    wakeups = 0
+    last_processed_slot = current_slot(duration) - 1
+
+    while time.time() < end:
+        await asyncio.sleep(0)
+        wakeups += 1
+
+        slot = current_slot(duration)
+
+        if chain[-1].slot == slot:
+            last_processed_slot = slot
+            continue
+
+        if slot == last_processed_slot:
+            await asyncio.sleep(1)
+            continue
+
+        slot_start = slot * duration
+        if not slot_start <= time.time() <= slot_start + tolerance:
+            await asyncio.sleep(0.5)
+            continue
+
+        # not the leader: wait for the primary deadline, then check
+        await asyncio.sleep(max(0, slot_start + tolerance - time.time()))
+        last_processed_slot = slot
+
+    return wakeups
+
+
+async def after(p2p, duration, tolerance, end):
+    chain = p2p.chain
+    wakeups = 0
+    last_processed_slot = current_slot(duration) - 1
+
+    while time.time() < end:
+        wakeups += 1
+
+        slot = current_slot(duration)
+
+        if chain[-1].slot >= slot or slot == last_processed_slot:
+            last_processed_slot = slot
+            await asyncio.sleep(max(0, (slot + 1) * duration - time.time()))
+            continue
+
+        slot_start = slot * duration
+        if not slot_start <= time.time() <= slot_start + tolerance:
+            last_processed_slot = slot
+            await asyncio.sleep(max(0, (slot + 1) * duration - time.time()))
+            continue
+
+        # not the leader: returns as soon as the block is appended
+        await p2p.wait_for_slot_block(slot, slot_start + tolerance)
+        last_processed_slot = slot
+
+    return wakeups
+
+
+async def measure(loop_fn, slots, duration, tolerance):
+    # start on a slot boundary so both runs see the same schedule
+    await asyncio.sleep((current_slot(duration) + 1) * duration - time.time())
+
+    p2p = P2PNetwork("bench", [FakeBlock(current_slot(duration))], None, None, None)
+    end = time.time() + slots * duration
+
+    cpu, wall = time.process_time(), time.time()
+    producer = asyncio.create_task(produce(p2p, duration, end))
+    wakeups = await loop_fn(p2p, duration, tolerance, end)
+    cpu, wall = time.process_time() - cpu, time.time() - wall
+    producer.cancel()
+
+    return wakeups / slots, cpu / wall
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--slots", type=int, default=5)
+    parser.add_argument("--slot-duration", type=float, default=2.0)
+    args = parser.parse_args()
+
+    tolerance = args.slot_duration / 4
+
+    print(f"{args.slots} slots of {args.slot_duration}s, block arrives {ARRIVAL_DELAY}s after slot start")
+    for name, loop_fn in (("before", before), ("after", after)):
+        per_slot, cpu = asyncio.run(measure(loop_fn, args.slots, args.slot_duration, tolerance))
+        print(f"{name + ':':8}{per_slot:12.1f} wakeups/slot   CPU {cpu:6.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+# bench/bench_wire.py
+"""
+Bytes on the wire and encode / decode time per message type.
+
+  python bench/bench_wire.py [--txs-per-block 20] [--rounds 5]
+
+Messages are shaped like the node's own (signed user txs with fees,
+blocks, compact blocks, 200-block sync pages, header pages) with
+random hashes, addresses and signatures, so nothing compresses better
+than it would live.
+
+"json":     version 1 frames (what old peers still get)
+"json+z":   JSON body, zlib above COMPRESS_MIN
+"bin":      binary encoding for block / tx messages
+"bin+z":    binary encoding, zlib above COMPRESS_MIN
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from core import wire
+from core.block import Block
+from core.compact_block import compact_block
+
+MAX_DECODED = 256 * 1024 * 1024
+
+MODES = {
+    "json": frozenset(),
+    "json+z": frozenset({"zlib"}),
+    "bin": frozenset({"bin"}),
+    "bin+z": frozenset({"bin", "zlib"}),
+}
+
+
+def address():
+    return "0x" + os.urandom(20).hex()
+
+
+def make_tx(sender, nonce):
+    amount = round(random.uniform(0.01, 500), 6)
+    return {
+        "txid": str(uuid.uuid4()),
+        "action": "transfer",
+        "asset": "ARGH",
+        "amount": amount,
+        "to": address(),
+        "nonce": nonce,
+        "chainId": 7,
+        "sender": sender,
+        "timestamp": int(time.time()),
+        "_meta": {
+            "sender": sender,
+            "signature": "0x" + os.urandom(65).hex(),
+            "received_at": int(time.time()),
+        },
+        "_fee": {"total": round(amount * 0.001, 8), "devs": 0.0, "orbital": 0.0, "validator": 0.0},
+    }
+
+
+def make_chain(blocks, txs_per_block, senders):
+    chain = []
+    prev_hash = "0" * 64
+    nonces = {}
+
+    for index in range(1, blocks + 1):
+        txs = []
+        for _ in range(txs_per_block):
+            sender = random.choice(senders)
+            txs.append(make_tx(sender, nonces.get(sender, 0)))
+            nonces[sender] = nonces.get(sender, 0) + 1
+
+        block = Block(index, prev_hash, txs, slot=index * 3, producer_id=address())
+        block.signature = os.urandom(64).hex()
+        chain.append(block)
+        prev_hash = block.hash
+
+    return chain
+
+
+def messages(txs_per_block):
+    senders = [address() for _ in range(50)]
+    chain = make_chain(200, txs_per_block, senders)
+    head = chain[-1].to_dict()
+
+    return {
+        "tx": {"type": "tx", "data": make_tx(senders[0], 0)},
+        "block": {"type": "block", "data": head},
+        "cmpct_block": {"type": "cmpct_block", "data": compact_block(head, lambda txid: True)},
+        "blocks (200)": {"type": "blocks", "from": 1, "data": [b.to_dict() for b in chain]},
+        "headers (200)": {"type": "headers", "from": 1, "data": [b.header() for b in chain]},
+        "inv (500)": {"type": "inv", "txids": [str(uuid.uuid4()) for _ in range(500)]},
+    }
+
+
+def timed(fn, rounds):
+    best = float("inf")
+    for _ in range(rounds):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--txs-per-block", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    random.seed(1)
+    print(f"{args.txs_per_block} txs per block, best of {args.rounds}")
+    print(f"{'message':<15}{'mode':<8}{'bytes':>11}{'ratio':>8}{'encode':>11}{'decode':>11}")
+
+    for name, msg in messages(args.txs_per_block).items():
+        baseline = None
+
+        for mode, features in MODES.items():
+            frame, encode = timed(lambda: wire.encode_frame(msg, features), args.rounds)
+            decoded, decode = timed(lambda: wire.decode_payload(frame[4:], MAX_DECODED), args.rounds)
+            assert decoded == msg, f"{name} / {mode} does not round-trip"
+
+            baseline = baseline or len(frame)
+            print(
+                f"{name:<15}{mode:<8}{len(frame):>11,}{len(frame) / baseline:>8.2f}"
+                f"{encode * 1e6:>9.0f}us{decode * 1e6:>9.0f}us"
+            )
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,20 @@
 HOST_IP="0.0.0.0"
 HOST_PORT=9000
-ORACLE_URL = "https://flare-oracle.argh.space/flare/"
\ No newline at end of file
+
+# Wire features offered in the p2p handshake (see core/wire.py):
+# "bin" binary block / tx encoding, "zlib" compression of large frames.
+P2P_WIRE_FEATURES = ("bin", "zlib")
+ORACLE_URL = "https://flare-oracle.argh.space/flare/"
+
+# Blocks of state undo journal kept for tip replacement / short reorgs.
+# Deeper blocks are treated as final and can only be re-derived by replay.
+STATE_UNDO_DEPTH = 64
+
+# Mempool bounds. When full, the lowest-fee (then oldest) txs are evicted;
+# txs older than MEMPOOL_TX_TTL seconds are dropped by the sweeper.
+MEMPOOL_MAX_TXS = 20_000
+MEMPOOL_MAX_BYTES = 32 * 1024 * 1024
+MEMPOOL_TX_TTL = 3 * 60 * 60
+# Pending txs per sender, which also bounds how far past the tip nonce
+# a new tx may be.
+MEMPOOL_MAX_PER_SENDER = 64
@@ -0,0 +1,55 @@
+# core/admission.py
+from config.settings import MEMPOOL_MAX_PER_SENDER
+from core.block_builder import nonce_key, tx_sender, with_fee
+from core.state_db import StateView
+
+
+def check_admission(tx, tip_balances, pending, protocol, tx_engine, max_pending=MEMPOOL_MAX_PER_SENDER):
+    """
+    Mempool ingress check for a user tx, with TransactionEngine.validate
+    against the tip balances plus the sender's pending txs. Raises
+    ValueError if the tx could not make it into a block.
+
+    A sender has at most max_pending txs queued, one per nonce, and no
+    nonce more than max_pending past the tip. Every pending tx is applied
+    first (on a view, the tip is never written), so funds must cover the
+    whole queue plus tx, whatever the order of arrival. A tx past a nonce
+    gap is checked as if the gap were filled: signature and funds must
+    hold, the exact nonce is left to block packing.
+    """
+    view = StateView(tip_balances)
+    counter = f"_nonce_{tx_sender(tx)}"
+    nonce = tx.get("nonce")
+    expected = view.get(counter, 0)
+    queued_txs = [
+        queued for queued in pending
+        if queued["txid"] != tx["txid"] and nonce_key(queued)[0] >= expected  # not mined yet
+    ]
+
+    if isinstance(nonce, int):
+        if nonce < expected:
+            raise ValueError(f"Invalid nonce: expected {expected}, got {nonce}")
+        if nonce >= expected + max_pending:
+            raise ValueError(f"Nonce too far ahead: expected {expected}, got {nonce}")
+        if any(queued.get("nonce") == nonce for queued in queued_txs):
+            raise ValueError(f"Nonce {nonce} already pending")
+
+    if len(queued_txs) >= max_pending:
+        raise ValueError(f"Too many pending txs from sender (max {max_pending})")
+
+    for queued in sorted(queued_txs, key=nonce_key):
+        try:
+            tx_engine.apply_tx(
+                view,
+                with_fee(queued, protocol),
+                system=False,
+                validator_address=None,
+                protocol=protocol
+            )
+        except (KeyError, TypeError, AttributeError):
+            continue  # cannot be mined either
+
+    if isinstance(nonce, int):
+        view[counter] = nonce
+
+    tx_engine.validate(tx, view, protocol)
@@ -7,6 +7,12 @@ from core.utils import canonical_tx_consensus
 
 GENESIS_PRODUCER_ID = "0x0000000000000000000000000000000000000000"
 
+# What a peer needs to check linkage, leader and signature without the txs
+HEADER_FIELDS = (
+    "index", "prev_hash", "hash", "producer_id",
+    "slot", "attempt", "flare_commit", "signature"
+)
+
 
 class Block:
     def __init__(
@@ -99,6 +105,9 @@ class Block:
 
         return data
 
+    def header(self) -> dict:
+        return {field: getattr(self, field) for field in HEADER_FIELDS}
+
     # --------------------------------------------------
 
     @classmethod
@@ -132,3 +141,33 @@ class Block:
 
         obj.hash = computed
         return obj
+
+
+class BlockHeader:
+    """
+    Block without its transactions. The hash cannot be recomputed from
+    a header; it is bound by the producer signature, and the body
+    fetched later must hash to it.
+    """
+
+    def __init__(self, index, prev_hash, hash, producer_id, slot, attempt=0, flare_commit=None, signature=None):
+        self.index = index
+        self.prev_hash = prev_hash
+        self.hash = hash
+        self.producer_id = producer_id
+        self.slot = slot
+        self.attempt = attempt
+        self.flare_commit = flare_commit
+        self.signature = signature
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        header = cls(**{field: data.get(field) for field in HEADER_FIELDS})
+        header.attempt = header.attempt or 0
+
+        if not isinstance(header.index, int) or not isinstance(header.slot, int):
+            raise ValueError("Invalid header")
+        if not isinstance(header.hash, str) or not isinstance(header.prev_hash, str):
+            raise ValueError("Invalid header")
+
+        return header
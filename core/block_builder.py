@@ -0,0 +1,308 @@
+# core/block_builder.py
+import asyncio
+import time
+from collections import deque
+
+from core.tx_engine import TransactionEngine
+
+
+def tx_sender(tx: dict) -> str:
+    """Address whose nonce the tx consumes (the signer, as in validate)"""
+    return (tx.get("_meta", {}).get("sender") or tx.get("sender") or "").lower()
+
+
+def nonce_key(tx: dict):
+    nonce = tx.get("nonce")
+    # malformed nonces sort first and are rejected by validate
+    return (nonce if isinstance(nonce, int) else -1, tx["txid"])
+
+
+def sender_queues(txs: list) -> list:
+    """User txs grouped per sender, each queue nonce-ordered, senders in address order"""
+    queues = {}
+    for tx in txs:
+        queues.setdefault(tx_sender(tx), []).append(tx)
+
+    return [deque(sorted(queues[sender], key=nonce_key)) for sender in sorted(queues)]
+
+
+def with_fee(tx: dict, protocol) -> dict:
+    txc = dict(tx)
+
+    if txc["action"] == "transfer":
+        txc["_fee"] = TransactionEngine.calculate_fee(txc["amount"], protocol)
+    else:
+        txc["_fee"] = {
+            "total": 0,
+            "devs": 0,
+            "orbital": 0,
+            "validator": 0
+        }
+
+    return txc
+
+
+async def pack_user_txs(txs, balances, protocol, tx_engine):
+    """
+    Picks the user txs for a block template.
+
+    Senders take turns (round robin, address order), each contributing
+    its next tx by nonce, so a sender with nonces n..n+k pending lands
+    all of them in one block. A tx whose nonce is ahead of the sender's
+    expected nonce is held back in the mempool together with the rest
+    of that sender's queue; only txs that fail validation are discarded.
+
+    `balances` is applied in place. Returns (valid_txs, invalid_txids).
+    """
+    queues = sender_queues(txs)
+    valid = []
+    invalid_txids = set()
+    checked = 0
+
+    while queues:
+        pending = []
+
+        for queue in queues:
+            tx = queue.popleft()
+
+            checked += 1
+            if checked % 10 == 0:
+                await asyncio.sleep(0)
+
+            sender = tx_sender(tx)
+            nonce = tx.get("nonce")
+            expected = balances.get(f"_nonce_{sender}", 0)
+
+            if isinstance(nonce, int) and nonce > expected:
+                continue  # nonce gap: hold this sender's queue for a later block
+
+            try:
+                tx_engine.validate(tx, balances, protocol)
+            except ValueError as e:
+                print(f"DISCARDED: {e}")
+                invalid_txids.add(tx["txid"])
+            else:
+                txc = with_fee(tx, protocol)
+                valid.append(txc)
+
+                tx_engine.apply_tx(
+                    balances,
+                    txc,
+                    system=False,
+                    validator_address=None,
+                    protocol=protocol
+                )
+
+            if queue:
+                pending.append(queue)
+
+        queues = pending
+
+    return valid, invalid_txids
+
+
+TEMPLATE_REFRESH_INTERVAL = 0.5  # seconds between template freshness checks
+COMMIT_RETRY_INTERVAL = 5  # seconds between oracle fetches for a slot
+
+
+class BlockTemplateBuilder:
+    """
+    Keeps the body of this node's next block ready before its slot:
+    reveal-phase system txs, packed user txs and the spendable balances
+    after them. The template is rebuilt when the tip, the target slot or
+    the mempool changes, and only for slots this node may lead. The flare
+    commit for that slot is fetched ahead too, so at slot start the
+    leader only adds fee rewards, signs and broadcasts.
+
+    prepare_reveal(parent_block, parent_balances, slot, tx_engine, txs,
+    protocol) -> (system_txs, reveal_tx); fetch_commit(slot) ->
+    (flare_commit, reveal_payload); is_leader(parent_block, slot) -> bool.
+    A slot is only targeted while its first `tolerance` seconds are open.
+    When this node leads none of them it sleeps in
+    wait_for_chain(timeout) until the tip moves or a slot boundary.
+    """
+
+    def __init__(self, chain, state_db, mempool, tx_engine, prepare_reveal, fetch_commit, is_leader, tolerance, wait_for_chain):
+        self.chain = chain
+        self.state_db = state_db
+        self.mempool = mempool
+        self.tx_engine = tx_engine
+        self.prepare_reveal = prepare_reveal
+        self.fetch_commit = fetch_commit
+        self.is_leader = is_leader
+        self.tolerance = tolerance
+        self.wait_for_chain = wait_for_chain
+
+        self.template = None
+        self.commits = {}        # slot -> (flare_commit, reveal_payload)
+        self.commit_tried = {}   # slot -> last fetch attempt
+        self.commit_task = None
+        self.commit_slot = None
+
+    def target_slot(self, parent_block, protocol) -> int:
+        """Next slot after the parent whose production window is still open"""
+        duration = protocol["slot_duration"]
+        now = time.time()
+        slot = int(now // duration)
+
+        if now - slot * duration > self.tolerance:
+            slot += 1
+
+        return max(parent_block.slot + 1, slot)
+
+    def next_boundary(self, protocol) -> float:
+        """Next time target_slot() can change without a new block"""
+        duration = protocol["slot_duration"]
+        now = time.time()
+        slot_start = (now // duration) * duration
+
+        if now < slot_start + self.tolerance:
+            return slot_start + self.tolerance
+        return slot_start + duration
+
+    def matches(self, template, parent_block, slot) -> bool:
+        return (
+            template is not None
+            and template["parent_hash"] == parent_block.hash
+            and template["slot"] == slot
+        )
+
+    async def build(self, parent_block, slot, protocol):
+        """Assembles a template on top of parent_block; None if its state is unreachable"""
+        self.state_db.sync(self.chain)
+        version = self.mempool.version
+
+        parent_balances = self.state_db.at(parent_block)
+        if parent_balances is None:
+            return None
+
+        txs = self.mempool.load()
+
+        system_txs, reveal_tx = await self.prepare_reveal(
+            parent_block,
+            parent_balances,
+            slot,
+            self.tx_engine,
+            txs,
+            protocol
+        )
+
+        user_txs = [
+            tx for tx in txs
+            if tx.get("action") != "flare_reveal"  # validated in the reveal phase
+        ]
+
+        balances = self.state_db.at(parent_block)
+        if balances is None:
+            return None
+
+        # Recover all senders in the worker pool, then check nonces and
+        # balances serially against the recovered addresses
+        if self.tx_engine.recovery is not None:
+            await self.tx_engine.recovery.prerecover(user_txs)
+
+        # Nonce-ordered per sender; future nonces stay in the mempool
+        valid_user_txs, invalid_txids = await pack_user_txs(
+            user_txs,
+            balances,
+            protocol,
+            self.tx_engine
+        )
+
+        if reveal_tx:
+            valid_user_txs.append(reveal_tx)
+
+        return {
+            "parent_hash": parent_block.hash,
+            "slot": slot,
+            "mempool_version": version,
+            "system_txs": system_txs,
+            "user_txs": valid_user_txs,
+            "invalid_txids": invalid_txids,
+            "balances": balances,
+            "built_at": time.time(),
+        }
+
+    async def refresh(self, protocol):
+        """Brings the template up to date; False if this node does not lead the target slot"""
+        if not self.chain:
+            return False
+
+        parent_block = self.chain[-1]
+        slot = self.target_slot(parent_block, protocol)
+
+        if not self.is_leader(parent_block, slot):
+            self.template = None
+            return False
+
+        self.prefetch_commit(slot)
+
+        template = self.template
+        if self.matches(template, parent_block, slot) and template["mempool_version"] == self.mempool.version:
+            return True
+
+        template = await self.build(parent_block, slot, protocol)
+
+        # The tip may have moved while building
+        if template is not None and self.chain[-1].hash == template["parent_hash"]:
+            self.template = template
+        return True
+
+    async def run(self, protocol, interval=TEMPLATE_REFRESH_INTERVAL):
+        while True:
+            leading = False
+            try:
+                leading = await self.refresh(protocol)
+            except Exception as e:
+                print("TEMPLATE BUILDER CRASHED:", e)
+
+            if leading:
+                # follow mempool arrivals
+                await asyncio.sleep(interval)
+            else:
+                await self.wait_for_chain(self.next_boundary(protocol) - time.time())
+
+    async def take(self, parent_block, slot, protocol):
+        """
+        Template for (parent_block, slot), built now if the background one
+        is missing or stale. Returns (template | None, prebuilt).
+        """
+        template, self.template = self.template, None
+
+        if self.matches(template, parent_block, slot):
+            return template, True
+
+        return await self.build(parent_block, slot, protocol), False
+
+    # --------------------------------------------------
+    # FLARE COMMIT
+    # --------------------------------------------------
+
+    def prefetch_commit(self, slot):
+        if slot in self.commits:
+            return
+        if self.commit_task is not None and not self.commit_task.done():
+            return
+        if time.time() - self.commit_tried.get(slot, 0) < COMMIT_RETRY_INTERVAL:
+            return
+
+        self.commit_tried = {slot: time.time()}
+        self.commit_slot = slot
+        self.commit_task = asyncio.create_task(self.load_commit(slot))
+
+    async def load_commit(self, slot):
+        commit, reveal = await self.fetch_commit(slot)
+        if commit:
+            self.commits = {slot: (commit, reveal)}
+        return commit, reveal
+
+    async def take_commit(self, slot):
+        """(flare_commit, reveal_payload) for slot, fetched now if not prefetched"""
+        pending = self.commit_task
+        if slot not in self.commits and self.commit_slot == slot and pending and not pending.done():
+            await asyncio.wait({pending})
+
+        if slot in self.commits:
+            return self.commits.pop(slot)
+
+        return await self.fetch_commit(slot)
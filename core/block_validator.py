@@ -1,55 +1,216 @@
 # core/block_validator
 import hashlib
+import time
+from core.block import GENESIS_PRODUCER_ID
 from core.consensus import select_block_producer
 from core.flare_source import FlareSource
 from core.treasury import TreasuryEngine
 from core.tx_engine import TransactionEngine
 from core.utils import canonical_json, get_protocol, q
-from core.validator_keystore import verify_block_signature
-from core.state import compute_balances
+from core.validator_keystore import block_signature_item, verify_block_signature
+from core.signature_verifier import SignatureVerifier
+from core.state import apply_block_balances, compute_balances
 
-from nacl.signing import VerifyKey
-from nacl.exceptions import BadSignatureError
+PROGRESS_EVERY = 1000  # blocks between two progress reports of a chain pass
 
 
 class BlockValidator:
-    def __init__(self, validators, validator_pubkeys, chain):
+    def __init__(self, validators, validator_pubkeys, chain, state_db=None):
         self.validators = validators
         self.validator_pubkeys = validator_pubkeys
         self.chain = chain
+        self.state_db = state_db
         self.tx_engine = TransactionEngine()
+        self.verifier = SignatureVerifier()
+
+    def balances_at(self, prev_block, chain_until_prev, protocol):
+        """
+        Balances after prev_block. When prev_block is the live tip, or an
+        ancestor still in the undo journal, the incremental state is used,
+        otherwise the prefix is replayed.
+        """
+        if self.state_db is not None:
+            self.state_db.sync(self.chain)
+            view = self.state_db.at(prev_block)
+            if view is not None:
+                return view
+
+        return compute_balances(chain_until_prev, protocol)
+
+    @staticmethod
+    def oracle_signature_items(payload: dict, protocol: dict) -> list:
+        """[(pubkey, message, signature)] for every oracle pubkey"""
+        message_payload = {
+            "id": payload["id"],
+            "slot": payload["slot"],
+            "class": payload["class"],
+            "flux": payload["flux"],
+            "geomag": payload["geomag"],
+        }
+
+        message = canonical_json(message_payload)
+        signature = bytes.fromhex(payload["oracle_signature"])
+
+        return [
+            (bytes.fromhex(pk), message, signature)
+            for pk in protocol["oracle"]["pubkeys"]
+        ]
 
     def verify_oracle_signature(self, payload: dict, protocol: dict) -> bool:
         try:
-            pubkeys = protocol["oracle"]["pubkeys"]
-
-            message_payload = {
-                "id": payload["id"],
-                "slot": payload["slot"],
-                "class": payload["class"],
-                "flux": payload["flux"],
-                "geomag": payload["geomag"],
-            }
-
-            message = canonical_json(message_payload)
-            signature = bytes.fromhex(payload["oracle_signature"])
-
-            valid_count = 0
-
-            for pk in pubkeys:
-                verify_key = VerifyKey(bytes.fromhex(pk))
-                try:
-                    verify_key.verify(message, signature)
-                    valid_count += 1
-                except BadSignatureError:
-                    continue
+            valid_count = sum(
+                1 for item in self.oracle_signature_items(payload, protocol)
+                if self.verifier.verify(*item)
+            )
 
             return valid_count >= protocol["oracle"]["threshold"]
 
         except Exception:
             return False
 
+    async def preverify(self, blocks, mode="live"):
+        """
+        Verifies the block (and, in live mode, oracle) signatures of a
+        page in parallel. validate() then consumes the results in order.
+        Returns the signature items cached for the caller to discard.
+        """
+        protocol = get_protocol(self.chain) or get_protocol(blocks)
+        items = []
+
+        for block in blocks:
+            try:
+                item = block_signature_item(block, self.validator_pubkeys)
+                if item:
+                    items.append(item)
+
+                if mode == "live" and protocol:
+                    for tx in block.transactions:
+                        if tx.get("action") == "flare_reveal":
+                            items.extend(self.oracle_signature_items(tx["payload"], protocol))
+
+            except Exception:
+                continue  # malformed: left to the inline checks
+
+        return await self.verifier.preverify(items)
+
     def validate(self, block, prev_block, chain_until_prev, mode="live"):
+        return self.check(
+            block,
+            prev_block,
+            get_protocol(chain_until_prev),
+            lambda protocol: self.balances_at(prev_block, chain_until_prev, protocol),
+            mode
+        )
+
+    def check_header(self, header, prev) -> bool:
+        """
+        Checks that need no txs: continuity, leader schedule and producer
+        signature. prev is the previous header or block (None for genesis).
+        Signatures are read from the verifier when preverify() ran first.
+        """
+        if prev is None:
+            return (
+                header.index == 0
+                and header.prev_hash == "0" * 64
+                and header.producer_id == GENESIS_PRODUCER_ID
+                and header.signature is None
+            )
+
+        if header.index != prev.index + 1:
+            print("Invalid header index")
+            return False
+
+        if header.prev_hash != prev.hash:
+            print("Invalid header prev_hash")
+            return False
+
+        if header.slot <= prev.slot:
+            print("Invalid header slot")
+            return False
+
+        expected_leader = select_block_producer(
+            validators=self.validators,
+            last_block_hash=prev.hash,
+            slot=header.slot,
+            attempt=header.attempt
+        )
+        if header.producer_id != expected_leader:
+            print(f"Unauthorized header producer (attempt={header.attempt})")
+            return False
+
+        if not header.signature:
+            return False
+
+        try:
+            return verify_block_signature(header, self.validator_pubkeys, self.verifier)
+        except (ValueError, AttributeError):
+            return False
+
+    def iter_validate(self, chain, mode="sync", progress_every=PROGRESS_EVERY, trusted=None):
+        """
+        Validates a whole chain in a single pass, carrying the balances
+        forward instead of replaying chain[:i] for every block.
+        Same accept/reject result as calling validate() per block.
+
+        trusted: {"index", "hash", "balances"} from a sealed checkpoint.
+        Blocks up to that index only get a hash-chain continuity check,
+        full validation resumes above it from the checkpoint balances.
+
+        Yields progress dicts; the last one has done=True and the result
+        in "valid".
+        """
+        total = len(chain)
+        protocol = get_protocol(chain)
+        balances = {}
+        started = time.time()
+
+        def progress(index, done=False, valid=None):
+            elapsed = max(time.time() - started, 1e-9)
+            rate = index / elapsed
+            return {
+                "index": index,
+                "total": total,
+                "rate": rate,
+                "eta": (total - index) / rate if rate else None,
+                "done": done,
+                "valid": valid,
+            }
+
+        for i, block in enumerate(chain):
+            prev = chain[i - 1] if i > 0 else None
+
+            if trusted and 0 < i <= trusted["index"]:
+                if block.index != i or block.prev_hash != prev.hash:
+                    print(f"Chain broken below checkpoint at block #{i}")
+                    yield progress(i, done=True, valid=False)
+                    return
+
+                if i == trusted["index"]:
+                    if block.hash != trusted["hash"]:
+                        print(f"Checkpoint hash mismatch at block #{i}")
+                        yield progress(i, done=True, valid=False)
+                        return
+                    balances = dict(trusted["balances"])
+
+            else:
+                if not self.check(block, prev, protocol if i > 0 else None, lambda _: balances, mode):
+                    print(f"Chain invalid at block #{i}")
+                    yield progress(i, done=True, valid=False)
+                    return
+
+                apply_block_balances(balances, block, protocol, self.tx_engine)
+
+            if progress_every and (i + 1) % progress_every == 0 and i + 1 < total:
+                yield progress(i + 1)
+
+        yield progress(total, done=True, valid=True)
+
+    def check(self, block, prev_block, protocol, balances_fn, mode="live"):
+        """
+        Core block checks. protocol is the genesis protocol (None if the
+        block has no predecessors), balances_fn(protocol) returns the
+        balances after prev_block.
+        """
 
         # --------------------------------------------------
         # 1. Basic structure
@@ -87,7 +248,6 @@ class BlockValidator:
                 return False
             return True
 
-        protocol = get_protocol(chain_until_prev)
         if not protocol:
             print("Missing protocol state")
             return False
@@ -173,7 +333,7 @@ class BlockValidator:
         # 5. Treasury validation (commit/reveal model)
         # --------------------------------------------------
 
-        balances = compute_balances(chain_until_prev, protocol)
+        balances = balances_fn(protocol)
         treasury_address = protocol["treasury"]
         native_asset = protocol["native_asset"]
         treasury_balance = balances.get(f"{treasury_address}:{native_asset}", 0)
@@ -265,7 +425,7 @@ class BlockValidator:
         if not block.signature:
             return False
 
-        if not verify_block_signature(block, self.validator_pubkeys):
+        if not verify_block_signature(block, self.validator_pubkeys, self.verifier):
             return False
 
         return True
\ No newline at end of file
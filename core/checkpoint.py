@@ -0,0 +1,72 @@
+# core/checkpoint.py
+import hashlib
+
+from core.storage import DATA_DIR, write_atomic
+from core.utils import canonical_json
+
+CHECKPOINT_FILE = DATA_DIR / "checkpoint.enc"
+
+
+def state_digest(state: dict) -> str:
+    return hashlib.sha256(canonical_json({
+        "balances": state["balances"],
+        "nonces": state["nonces"],
+        "pools": state["pools"],
+    })).hexdigest()
+
+
+class CheckpointStore:
+    """
+    Locally sealed record of the highest block this node has fully
+    validated: (index, block hash, state digest). It is encrypted with
+    the node's Fernet key, so a token that decrypts was written by this
+    node and has not been modified.
+    """
+
+    def __init__(self, crypto):
+        self.crypto = crypto
+
+    def seal(self, index: int, block_hash: str, state: dict):
+        write_atomic(CHECKPOINT_FILE, self.crypto.encrypt({
+            "index": index,
+            "hash": block_hash,
+            "state_digest": state_digest(state),
+        }))
+
+    def load(self):
+        if not CHECKPOINT_FILE.exists():
+            return None
+
+        try:
+            return self.crypto.decrypt(CHECKPOINT_FILE.read_bytes())
+        except Exception as e:
+            print("CHECKPOINT DECRYPT FAILED:", e)
+            return None
+
+    def trusted(self, chain, snapshots, protocol):
+        """
+        Returns {"index", "hash", "balances"} for the sealed checkpoint if
+        it still matches the local chain and the state rebuilt at that
+        height, otherwise None (full verification).
+        """
+        checkpoint = self.load()
+        if not checkpoint:
+            return None
+
+        index = checkpoint["index"]
+
+        if index >= len(chain) or chain[index].hash != checkpoint["hash"]:
+            print(f"Checkpoint #{index} does not match the local chain, ignoring")
+            return None
+
+        state, _ = snapshots.restore(protocol, index)
+
+        if state_digest(state) != checkpoint["state_digest"]:
+            print(f"Checkpoint #{index} state digest mismatch, ignoring")
+            return None
+
+        return {
+            "index": index,
+            "hash": checkpoint["hash"],
+            "balances": state["balances"],
+        }
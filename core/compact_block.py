@@ -0,0 +1,74 @@
+# core/compact_block.py
+import hashlib
+
+from core.utils import canonical_json
+
+LEADER_FIELDS = ("_fee",)  # set by the block producer, not present in gossiped txs
+
+
+def tx_digest(tx: dict) -> str:
+    """
+    Digest of a tx as gossiped (leader-added fields stripped). The block
+    hash only covers consensus fields, so this pins sender, _meta etc.:
+    a mempool copy is only used if it is exactly what the leader had.
+    """
+    gossiped = {key: value for key, value in tx.items() if key not in LEADER_FIELDS}
+    return hashlib.sha256(canonical_json(gossiped)).hexdigest()
+
+
+def compact_block(block_dict: dict, in_mempool) -> dict:
+    """
+    Block header plus, per tx, either a short reference {"txid", "digest",
+    leader fields} for txs peers got through gossip, or {"tx": full tx}
+    for the rest (system txs, rewards).
+    """
+    compact = {key: value for key, value in block_dict.items() if key != "transactions"}
+    entries = []
+
+    for tx in block_dict["transactions"]:
+        if not in_mempool(tx.get("txid")):
+            entries.append({"tx": tx})
+            continue
+
+        entry = {"txid": tx["txid"], "digest": tx_digest(tx)}
+        for key in LEADER_FIELDS:
+            if key in tx:
+                entry[key] = tx[key]
+        entries.append(entry)
+
+    compact["entries"] = entries
+    return compact
+
+
+def rebuild_txs(compact: dict, lookup) -> tuple:
+    """
+    Fills the tx list from `lookup(txid) -> tx | None` (the mempool).
+    Returns (txs, missing): txs has None at every index in `missing`.
+    """
+    txs = []
+    missing = []
+
+    for i, entry in enumerate(compact["entries"]):
+        if "tx" in entry:
+            txs.append(entry["tx"])
+            continue
+
+        known = lookup(entry["txid"])
+        if known is None or tx_digest(known) != entry["digest"]:
+            txs.append(None)
+            missing.append(i)
+            continue
+
+        tx = {key: value for key, value in known.items() if key not in LEADER_FIELDS}
+        for key in LEADER_FIELDS:
+            if key in entry:
+                tx[key] = entry[key]
+        txs.append(tx)
+
+    return txs, missing
+
+
+def block_dict_from(compact: dict, txs: list) -> dict:
+    data = {key: value for key, value in compact.items() if key != "entries"}
+    data["transactions"] = txs
+    return data
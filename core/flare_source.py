@@ -1,8 +1,8 @@
 import requests
 from typing import Optional
-from nacl.signing import VerifyKey
 from nacl.exceptions import BadSignatureError
 from config.settings import ORACLE_URL
+from core.signature_verifier import get_verify_key
 from core.utils import canonical_json
 class FlareSource:
     """
@@ -79,7 +79,7 @@ class FlareSource:
 
             for pk in self.pubkeys:
                 try:
-                    verify_key = VerifyKey(bytes.fromhex(pk))
+                    verify_key = get_verify_key(bytes.fromhex(pk))
                     verify_key.verify(message, signature)
                     valid_sigs += 1
                 except BadSignatureError:
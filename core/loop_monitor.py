@@ -0,0 +1,63 @@
+# core/loop_monitor.py
+
+import asyncio
+
+LOOP_PROBE_INTERVAL = 0.01  # seconds between two probes of the event loop
+LOOP_STALL_THRESHOLD = 0.05  # seconds of lateness counted as a stall
+
+
+class LoopMonitor:
+    """
+    Measures how long the event loop is held by a single callback: a
+    task sleeps LOOP_PROBE_INTERVAL at a time and records how late it
+    wakes up. Lateness is the time something ran without yielding (plus
+    a little scheduling noise), so the maximum is the worst stall a
+    block, a ping or a peer's frame had to wait through.
+
+    Each probe wakes the loop, so the node only runs it while syncing
+    (start / stop around the sync); stats add up until take().
+    """
+
+    def __init__(self, interval=LOOP_PROBE_INTERVAL, threshold=LOOP_STALL_THRESHOLD):
+        self.interval = interval
+        self.threshold = threshold
+        self.task = None
+        self.reset()
+
+    def reset(self):
+        self.max_stall = 0.0
+        self.stalls = 0  # probes later than threshold
+        self.probes = 0
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+
+    def stop(self):
+        if self.task:
+            self.task.cancel()
+            self.task = None
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+
+        while True:
+            due = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.record(loop.time() - due)
+
+    def record(self, lateness):
+        self.probes += 1
+        self.max_stall = max(self.max_stall, lateness)
+        if lateness >= self.threshold:
+            self.stalls += 1
+
+    def take(self) -> dict:
+        """Stats since the last take(), then starts over"""
+        stats = {
+            "max_stall_ms": round(self.max_stall * 1000, 1),
+            "stalls": self.stalls,
+            "probes": self.probes,
+        }
+        self.reset()
+        return stats
@@ -1,53 +1,410 @@
+import asyncio
+import hashlib
+import heapq
+import threading
+import time
+from decimal import Decimal
 from pathlib import Path
+from config.settings import MEMPOOL_MAX_BYTES, MEMPOOL_MAX_TXS, MEMPOOL_TX_TTL
+from core.block_builder import tx_sender
 from core.crypto import CryptoStore
+from core.storage import write_atomic
+from core.tx_engine import TransactionEngine
+from core.utils import canonical_json
 
 MEMPOOL_FILE = Path("/data/mempool.enc")
+MEMPOOL_INBOX = Path("/data/mempool_inbox")
+MEMPOOL_FLUSH_INTERVAL = 2  # seconds between write-behind flushes
+MEMPOOL_SWEEP_INTERVAL = 60  # seconds between TTL sweeps
+
+# A reveal the node checked against its tip pays no fee but must never be
+# crowded out by paying txs (it carries the treasury commit/reveal flow)
+PROTOCOL_RANK = Decimal("Infinity")  # ranks above any fee
 
 class Mempool:
-    def __init__(self):
+    """
+    In-memory mempool indexed by txid and by sender (nonce-ordered).
+
+    The owner (the node) persists it write-behind: run_persistence()
+    periodically writes one encrypted snapshot with an atomic replace,
+    so a crash loses at most the last interval of gossip.
+
+    Other processes (the API) open it with owner=False: they read the
+    snapshot, and add() drops the tx into an inbox directory that the
+    node merges. Inbox files are deleted only once a snapshot holding
+    them has been written.
+
+    The owner is bounded by max_txs / max_bytes: a tx that does not fit
+    evicts the entries with the lowest fee, the oldest first among equal
+    fees, or is rejected if every entry pays more. An evicted tx takes
+    the later nonces of its sender with it, as they could no longer be
+    mined. A reveal added with verified=True outranks any fee, at most
+    one per commit; any other tx without a fee ranks 0. Set `protocol`
+    to rank by the fee TransactionEngine.calculate_fee charges.
+    """
+
+    def __init__(self, owner=True, max_txs=MEMPOOL_MAX_TXS, max_bytes=MEMPOOL_MAX_BYTES, ttl=MEMPOOL_TX_TTL):
         self.crypto = CryptoStore()
+        self.owner = owner
+        self.lock = threading.Lock()
 
-        if not MEMPOOL_FILE.exists():
-            MEMPOOL_FILE.parent.mkdir(parents=True, exist_ok=True)
-            encrypted = self.crypto.encrypt([])
-            MEMPOOL_FILE.write_bytes(encrypted)
+        self.max_txs = max_txs
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.protocol = None
 
-    def add(self, tx_dict: dict):
-        txs = self.load()
+        self.txs = {}        # txid -> tx (arrival order)
+        self.by_sender = {}  # sender -> {txid: nonce}
+        self.sizes = {}      # txid -> encoded size
+        self.bytes = 0
+        self.ranks = {}      # txid -> (fee, received_at, seq)
+        self.verified = set()  # txids ranked PROTOCOL_RANK
+        self.reveals = {}    # commit -> txid of its verified reveal
+        self.heap = []       # ranks, cheapest first; stale entries skipped
+        self.seq = 0
+        self.version = 0     # bumped on every change, lets readers skip rebuilds
+        self.dirty = False
+        self.ingested = set()  # inbox files merged but not persisted yet
 
-        if any(tx["txid"] == tx_dict["txid"] for tx in txs):
-            print("TX already in mempool:", tx_dict["txid"])
-            return False
+        MEMPOOL_FILE.parent.mkdir(parents=True, exist_ok=True)
+
+        for tx in self.read_snapshot():
+            self.index(tx)
+
+        self.counters = {"admitted": 0, "rejected": 0, "evicted": 0, "expired": 0}
+
+        if owner:
+            self.merge_inbox(self.read_inbox())
+        else:
+            for _, tx in self.read_inbox():
+                if tx["txid"] not in self.txs:
+                    self.index(tx)
+
+    # --------------------------------------------------
+    # INDEX
+    # --------------------------------------------------
+
+    @staticmethod
+    def received_at(tx: dict) -> int:
+        # never later than now: a future time would outlive the TTL
+        now = int(time.time())
+        return min(tx.get("_meta", {}).get("received_at") or tx.get("timestamp") or now, now)
+
+    def fee(self, tx: dict) -> Decimal:
+        if tx.get("txid") in self.verified:
+            return PROTOCOL_RANK
+        if self.protocol is None or tx.get("action") != "transfer":
+            return Decimal(0)
+        try:
+            return Decimal(str(TransactionEngine.calculate_fee(tx["amount"], self.protocol)["total"]))
+        except Exception:
+            return Decimal(0)
+
+    def index(self, tx: dict):
+        txid = tx["txid"]
+        self.txs[txid] = tx
+        self.version += 1
+
+        sender = tx_sender(tx)
+        if sender:
+            self.by_sender.setdefault(sender, {})[txid] = tx.get("nonce")
+
+        self.sizes[txid] = len(canonical_json(tx))
+        self.bytes += self.sizes[txid]
+
+        self.seq += 1
+        rank = (self.fee(tx), self.received_at(tx), self.seq, txid)
+        self.ranks[txid] = rank
+        heapq.heappush(self.heap, rank)
+
+    def unindex(self, txid: str):
+        tx = self.txs.pop(txid, None)
+        if tx is None:
+            return
+        self.version += 1
 
-        txs.append(tx_dict)
-        encrypted = self.crypto.encrypt(txs)
-        MEMPOOL_FILE.write_bytes(encrypted)
+        self.bytes -= self.sizes.pop(txid)
+        self.ranks.pop(txid)
+        if txid in self.verified:
+            self.verified.discard(txid)
+            self.reveals.pop(tx.get("commit"), None)
+
+        sender = tx_sender(tx)
+        queue = self.by_sender.get(sender)
+        if queue is not None:
+            queue.pop(txid, None)
+            if not queue:
+                del self.by_sender[sender]
+
+        if len(self.heap) > 2 * len(self.ranks) + 64:
+            self.heap = list(self.ranks.values())
+            heapq.heapify(self.heap)
+
+    def cheapest(self):
+        while self.heap:
+            rank = self.heap[0]
+            if self.ranks.get(rank[3]) == rank:
+                return rank
+            heapq.heappop(self.heap)
+        return None
+
+    def queue_tail(self, txid: str) -> list:
+        """txid and the later nonces of its sender, which it would strand"""
+        tx = self.txs[txid]
+        nonce = tx.get("nonce")
+        if not isinstance(nonce, int):
+            return [txid]
+
+        queue = self.by_sender.get(tx_sender(tx), {})
+        return [txid] + [
+            other for other, other_nonce in queue.items()
+            if isinstance(other_nonce, int) and other_nonce > nonce
+        ]
+
+    def admit(self, tx: dict) -> bool:
+        """Indexes tx, evicting lower-ranked entries to make room. Caller holds the lock."""
+        size = len(canonical_json(tx))
+        fee = self.fee(tx)
+        sender = tx_sender(tx)
+        count, total = len(self.txs) + 1, self.bytes + size
+        popped = []
+        victims = {}  # txid -> None, in eviction order
+
+        while count > self.max_txs or total > self.max_bytes:
+            rank = self.cheapest()
+
+            if rank is not None and rank[3] in victims:
+                # already leaving with its sender's queue
+                popped.append(heapq.heappop(self.heap))
+                continue
+
+            # equal fees: the newcomer displaces the older entry, unless
+            # that is one of its own sender's, which it needs to be mined
+            if rank is None or rank[0] > fee or (sender and tx_sender(self.txs[rank[3]]) == sender):
+                # lowest itself: put the candidates back untouched
+                for victim in popped:
+                    heapq.heappush(self.heap, victim)
+                self.counters["rejected"] += 1
+                print("Mempool full, rejected TX:", tx["txid"])
+                return False
+
+            popped.append(heapq.heappop(self.heap))
+            for txid in self.queue_tail(rank[3]):
+                if txid not in victims:
+                    victims[txid] = None
+                    count -= 1
+                    total -= self.sizes[txid]
+
+        for txid in victims:
+            self.unindex(txid)
+        self.counters["evicted"] += len(victims)
+
+        self.index(tx)
+        self.counters["admitted"] += 1
+        return True
+
+    # --------------------------------------------------
+    # PUBLIC API
+    # --------------------------------------------------
+
+    def add(self, tx_dict: dict, verified=False):
+        """verified: a flare_reveal the caller checked against the tip"""
+        if not self.owner:
+            return self.add_to_inbox(tx_dict)
+
+        with self.lock:
+            if tx_dict["txid"] in self.txs:
+                print("TX already in mempool:", tx_dict["txid"])
+                return False
+
+            if verified:
+                if tx_dict["commit"] in self.reveals:
+                    print("Reveal already pending for commit:", tx_dict["commit"])
+                    return False
+                self.verified.add(tx_dict["txid"])
+
+            if not self.admit(tx_dict):
+                self.verified.discard(tx_dict["txid"])
+                return False
+            if verified:
+                self.reveals[tx_dict["commit"]] = tx_dict["txid"]
+            self.dirty = True
 
         return True
 
     def load(self):
+        with self.lock:
+            return list(self.txs.values())
+
+    def contains(self, txid: str) -> bool:
+        return txid in self.txs
+
+    def get(self, txid: str):
+        return self.txs.get(txid)
 
+    def sender_queue(self, sender: str) -> list:
+        """Pending txs of a sender (signer address) ordered by nonce"""
+        with self.lock:
+            queue = self.by_sender.get(sender.lower(), {})
+            txids = sorted(
+                (txid for txid, nonce in queue.items() if isinstance(nonce, int)),
+                key=lambda txid: (queue[txid], txid)
+            )
+            return [self.txs[txid] for txid in txids]
+
+    def senders(self) -> list:
+        with self.lock:
+            return list(self.by_sender)
+
+    def flush(self):
+        """Drains the mempool and removes its persisted snapshot"""
+        with self.lock:
+            txs = list(self.txs.values())
+            self.txs.clear()
+            self.by_sender.clear()
+            self.sizes.clear()
+            self.ranks.clear()
+            self.verified.clear()
+            self.reveals.clear()
+            self.heap.clear()
+            self.bytes = 0
+            self.version += 1
+            self.dirty = False
+
+        if MEMPOOL_FILE.exists():
+            MEMPOOL_FILE.unlink()
+        return txs
+
+    def remove_many(self, txids: set[str]):
+        with self.lock:
+            for txid in txids:
+                if txid in self.txs:
+                    self.unindex(txid)
+                    self.dirty = True
+
+    def set_protocol(self, protocol):
+        """Ranks every entry by the fee it pays under `protocol`"""
+        with self.lock:
+            self.protocol = protocol
+            for txid, (_, received_at, seq, _) in list(self.ranks.items()):
+                self.ranks[txid] = (self.fee(self.txs[txid]), received_at, seq, txid)
+            self.heap = list(self.ranks.values())
+            heapq.heapify(self.heap)
+
+    def expire(self, now=None) -> int:
+        """Drops txs received more than `ttl` seconds ago"""
+        cutoff = (now or time.time()) - self.ttl
+
+        with self.lock:
+            expired = [
+                txid for txid, rank in self.ranks.items()
+                if rank[1] < cutoff
+            ]
+            for txid in expired:
+                self.unindex(txid)
+
+            if expired:
+                self.counters["expired"] += len(expired)
+                self.dirty = True
+
+        return len(expired)
+
+    async def run_expiry(self, interval=MEMPOOL_SWEEP_INTERVAL):
+        while True:
+            await asyncio.sleep(interval)
+            expired = self.expire()
+            if expired:
+                print(f"Mempool: expired {expired} TX")
+
+    def stats(self) -> dict:
+        return {
+            "txs": len(self.txs),
+            "bytes": self.bytes,
+            **self.counters,
+        }
+
+    # --------------------------------------------------
+    # PERSISTENCE
+    # --------------------------------------------------
+
+    def read_snapshot(self) -> list:
         if not MEMPOOL_FILE.exists():
-            print("MEMPOOL FILE NOT FOUND:", MEMPOOL_FILE)
             return []
 
         raw = MEMPOOL_FILE.read_bytes()
 
         try:
-            txs = self.crypto.decrypt(raw)
-            return txs
+            return self.crypto.decrypt(raw)
         except Exception as e:
             print("MEMPOOL DECRYPT FAILED:", e)
             return []
 
-    def flush(self):
-        txs = self.load()
-        if MEMPOOL_FILE.exists():
-            MEMPOOL_FILE.unlink()
-        return txs
+    def persist(self):
+        """Writes a snapshot if anything changed since the last one"""
+        with self.lock:
+            if not self.dirty and not self.ingested:
+                return
+            txs = list(self.txs.values())
+            merged = set(self.ingested)
+            self.dirty = False
 
-    def remove_many(self, txids: set[str]):
-        txs = self.load()
-        txs = [tx for tx in txs if tx["txid"] not in txids]
-        encrypted = self.crypto.encrypt(txs)
-        MEMPOOL_FILE.write_bytes(encrypted)
\ No newline at end of file
+        try:
+            write_atomic(MEMPOOL_FILE, self.crypto.encrypt(txs))
+        except Exception:
+            self.dirty = True
+            raise
+
+        for path in merged:
+            path.unlink(missing_ok=True)
+
+        with self.lock:
+            self.ingested -= merged
+
+    async def run_persistence(self, interval=MEMPOOL_FLUSH_INTERVAL):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                self.merge_inbox(await asyncio.to_thread(self.read_inbox))
+                await asyncio.to_thread(self.persist)
+            except Exception as e:
+                print("MEMPOOL PERSIST FAILED:", e)
+
+    # --------------------------------------------------
+    # INBOX (cross-process submissions)
+    # --------------------------------------------------
+
+    def inbox_path(self, txid: str) -> Path:
+        return MEMPOOL_INBOX / f"{hashlib.sha256(txid.encode()).hexdigest()}.enc"
+
+    def add_to_inbox(self, tx_dict: dict):
+        path = self.inbox_path(tx_dict["txid"])
+
+        if tx_dict["txid"] in self.txs or path.exists():
+            print("TX already in mempool:", tx_dict["txid"])
+            return False
+
+        MEMPOOL_INBOX.mkdir(parents=True, exist_ok=True)
+        write_atomic(path, self.crypto.encrypt(tx_dict))
+        self.index(tx_dict)
+        return True
+
+    def read_inbox(self) -> list:
+        if not MEMPOOL_INBOX.exists():
+            return []
+
+        records = []
+        for path in MEMPOOL_INBOX.glob("*.enc"):
+            try:
+                records.append((path, self.crypto.decrypt(path.read_bytes())))
+            except Exception as e:
+                print("MEMPOOL INBOX READ FAILED:", path.name, e)
+        return records
+
+    def merge_inbox(self, records: list):
+        with self.lock:
+            for path, tx in records:
+                if path in self.ingested:
+                    continue
+                if tx["txid"] not in self.txs and self.admit(tx):
+                    self.dirty = True
+                self.ingested.add(path)
@@ -1,19 +1,83 @@
 # core/network.py
 
 import asyncio
+import hashlib
 import json
 import struct
 import time
-from core.peer import Peer
+from concurrent.futures import ProcessPoolExecutor
+from core import wire
+from core.peer import CONSENSUS, GOSSIP, SYNC, Peer
 from core.block import Block
 from config.settings import HOST_IP, HOST_PORT
-from core.tx_engine import TransactionEngine
+from core.tx_engine import TransactionEngine, signed_message
+from core.admission import check_admission
+from core.compact_block import block_dict_from, compact_block, rebuild_txs
+from core.block_builder import tx_sender
+from core.sync import SYNC_HEADERS_PAGE, RangeSync, find_ancestor
+from core.utils import canonical_json, get_protocol
 
 MAX_MSG_SIZE = 10 * 1024 * 1024  # 10 MB
 BLOCKS_PER_PAGE = 200
+COMPACT_PENDING_TTL = 30  # seconds a half-rebuilt compact block waits for its txs
+SERVED_BLOCKS_DEPTH = 16  # recent blocks whose txs can be requested (get_block_txs)
+INV_INTERVAL = 0.2  # seconds between inv flushes
+INV_BATCH = 1000  # txids per inv / getdata message
+GETDATA_TIMEOUT = 5  # seconds before a txid requested from one peer is asked of another
+DECODE_OFFLOAD_MIN = 64 * 1024  # frame bytes from which decoding runs in the decode pool
+DECODE_WORKERS = 2  # decode processes, and frames decoded at once
+APPLY_SLICE = 0.02  # seconds of block validation between two yields to the loop
+
+# Outbound lane per message type (see core/peer.py): blocks and control
+# traffic overtake sync pages, which overtake tx gossip
+MESSAGE_LANES = {
+    "block": CONSENSUS,
+    "cmpct_block": CONSENSUS,
+    "get_block_txs": CONSENSUS,
+    "block_txs": CONSENSUS,
+    "single_block": CONSENSUS,
+    "status": CONSENSUS,
+    "ping": CONSENSUS,
+    "pong": CONSENSUS,
+    "get_headers": SYNC,
+    "headers": SYNC,
+    "get_blocks": SYNC,
+    "blocks": SYNC,
+    "get_block": SYNC,
+    "inv": GOSSIP,
+    "getdata": GOSSIP,
+    "tx": GOSSIP,
+}
+
+
+def parse_blocks(received):
+    """Parses a page up to the first bad block: (blocks, error or None)"""
+    blocks = []
+    for raw in received:
+        try:
+            blocks.append(Block.from_dict(raw))
+        except Exception as e:
+            return blocks, e
+    return blocks, None
+
+
+def decode_frame(payload: bytes, max_size: int) -> dict:
+    """
+    Decodes a frame. The blocks of a "blocks" page are parsed (and their
+    hashes recomputed) here as well, so that for large frames all of it
+    happens in the decode pool: msg["data"] then holds the Block objects
+    up to the first bad one, msg["error"] why it stopped (or None).
+    """
+    msg = wire.decode_payload(payload, max_size)
+
+    if msg.get("type") == "blocks":
+        msg["data"], msg["error"] = parse_blocks(msg["data"])
+
+    return msg
+
 
 class P2PNetwork:
-    def __init__(self, my_node_id, chain, storage, validator, mempool, my_host=HOST_IP, my_port=HOST_PORT):
+    def __init__(self, my_node_id, chain, storage, validator, mempool, my_host=HOST_IP, my_port=HOST_PORT, tx_engine=None):
         self.my_node_id = my_node_id
         self.chain = chain
         self.storage = storage
@@ -24,9 +88,113 @@ class P2PNetwork:
         self.syncing = False
         self.sync_target = None
         self.buffered_blocks = []
+        self.range_sync = RangeSync(self)
+        self.loop_monitor = None  # LoopMonitor probing the loop while syncing
         self.mempool = mempool
-        self.tx_engine = TransactionEngine()
+        # Shared with the block builder, so both use one sender cache
+        self.tx_engine = tx_engine or TransactionEngine()
         self.slot_registry = {}
+        self.pending_compact = {}  # block hash -> compact block waiting for txs
+        self.requested = {}  # txid -> time of the getdata that asked for it
+        self.gossip_stats = {"tx_received": 0, "tx_duplicate": 0, "inv_sent": 0, "getdata_sent": 0}
+        # Large frames are decoded off the loop, a bounded number at a time
+        self.decoder = None
+        self.decode_slots = asyncio.Semaphore(DECODE_WORKERS)
+        # Replaced on every tip change, so waiters never need to clear it
+        self.chain_event = asyncio.Event()
+
+    def chain_changed(self):
+        """Wakes everything waiting on the tip (slot scheduler, template builder)"""
+        self.chain_event.set()
+        self.chain_event = asyncio.Event()
+
+    async def wait_for_chain_change(self, timeout):
+        """True if the tip changed within `timeout` seconds"""
+        try:
+            await asyncio.wait_for(self.chain_event.wait(), max(0, timeout))
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def wait_for_slot_block(self, slot, deadline):
+        """Sleeps until the tip reaches `slot` or `deadline` passes; True if it did"""
+        while not (self.chain and self.chain[-1].slot >= slot):
+            timeout = deadline - time.time()
+            if timeout <= 0 or not await self.wait_for_chain_change(timeout):
+                return bool(self.chain) and self.chain[-1].slot >= slot
+        return True
+
+    def verified_reveal(self, tx) -> bool:
+        """
+        True if tx reveals the tip's flare_commit and comes from the tip
+        producer: the reveal the next block has to carry. Only such a
+        reveal outranks fees in the mempool.
+        """
+        if not self.chain:
+            return False
+        tip = self.chain[-1]
+
+        try:
+            commit = hashlib.sha256(canonical_json(tx["payload"])).hexdigest()
+        except Exception:
+            return False
+
+        return (
+            tx["sender"] == tip.producer_id
+            and tx["commit"] == tip.flare_commit
+            and commit == tip.flare_commit
+        )
+
+    async def admission_error(self, tx):
+        """
+        Why a gossiped user tx cannot enter the mempool, or None.
+        Checked against the tip state plus the sender's pending txs;
+        skipped while syncing, when the local tip is not current.
+        """
+        state_db = self.validator.state_db
+        if state_db is None or self.syncing or not self.chain:
+            return None
+
+        meta = tx.get("_meta")
+        if not isinstance(meta, dict) or not isinstance(meta.get("signature"), (str, bytes)):
+            return "Missing signature"
+
+        recovery = self.tx_engine.recovery
+        if recovery is not None:
+            try:
+                # off the event loop; validate() then reads the cached sender
+                await recovery.recover_one(signed_message(tx), meta["signature"])
+            except Exception:
+                return "Invalid signature"
+
+        try:
+            state_db.sync(self.chain)
+            check_admission(
+                tx,
+                state_db.balances,
+                self.mempool.sender_queue(tx_sender(tx)),
+                get_protocol(self.chain),
+                self.tx_engine
+            )
+        except Exception as e:
+            return str(e) or type(e).__name__
+
+        return None
+
+    def rollback_to(self, index):
+        """Drops the blocks above index (branch switch) and returns them, oldest first"""
+        dropped = self.chain[index + 1:]
+        del self.chain[index + 1:]
+
+        for block in dropped:
+            key = (block.producer_id, block.slot)
+            if self.slot_registry.get(key) == block.hash:
+                del self.slot_registry[key]
+
+        if dropped:
+            print(f"Rolled back {len(dropped)} blocks to #{index}")
+            self.chain_changed()
+        return dropped
 
     def register_block(self, block):
         key = (block.producer_id, block.slot)
@@ -51,15 +219,12 @@ class P2PNetwork:
                 try:
                     reader, writer = await asyncio.open_connection(host, port)
 
-                    await self.send(writer, {
-                        "type": "handshake",
-                        "node_id": self.my_node_id
-                    })
+                    await self.send(writer, self.handshake())
 
                     msg = await self.read_message(reader)
                     peer_node_id = msg["node_id"]
 
-                    self.peers[peer_node_id] = Peer(peer_node_id, writer)
+                    self.add_peer(peer_node_id, writer, wire.negotiate(msg), wire.peer_version(msg))
 
                     latest_index = len(self.chain) - 1
                     latest_hash = self.chain[-1].hash if self.chain else None
@@ -104,10 +269,7 @@ class P2PNetwork:
             if peer_node_id in self.peers:
                 return
 
-            await self.send(writer, {
-                "type": "handshake",
-                "node_id": self.my_node_id
-            })
+            await self.send(writer, self.handshake())
 
             await self.send(writer, {
                 "type": "status",
@@ -115,7 +277,7 @@ class P2PNetwork:
                 "latest_hash": self.chain[-1].hash if self.chain else None
             })
 
-            self.peers[peer_node_id] = Peer(peer_node_id, writer)
+            self.add_peer(peer_node_id, writer, wire.negotiate(msg), wire.peer_version(msg))
             print(f"Peer connected: {peer_node_id}")
 
             while True:
@@ -129,28 +291,79 @@ class P2PNetwork:
                 print(f"Peer {peer_node_id} disconnected: {e}")
         finally:
             if peer_node_id:
-                self.peers.pop(peer_node_id, None)
+                self.remove_peer(peer_node_id, writer)
             writer.close()
 
     # --------------------
     # TCP HELPERS
     # --------------------
+    def handshake(self) -> dict:
+        # Version 1 peers ignore the extra keys and get JSON frames
+        return {
+            "type": "handshake",
+            "node_id": self.my_node_id,
+            "version": wire.PROTOCOL_VERSION,
+            "features": list(wire.FEATURES)
+        }
+
+    def add_peer(self, peer_id, writer, features=frozenset(), version=1):
+        peer = Peer(peer_id, writer, features=features, version=version)
+        if features:
+            print(f"Peer {peer_id} wire features: {', '.join(sorted(features))}")
+        if version < 2:
+            print(f"Peer {peer_id} speaks protocol version {version}")
+        self.peers[peer_id] = peer
+        peer.start(on_close=lambda closed: self.remove_peer(closed.node_id, closed.writer))
+        return peer
+
+    def remove_peer(self, peer_id, writer=None):
+        """Forgets peer_id, unless it has been replaced by a newer connection than `writer`"""
+        peer = self.peers.get(peer_id)
+        if peer is None or (writer is not None and peer.writer is not writer):
+            return
+
+        del self.peers[peer_id]
+        peer.close()
+
+    @staticmethod
+    def encode_frame(msg: dict, features=frozenset()) -> bytes:
+        return wire.encode_frame(msg, features)
+
     async def broadcast(self, msg: dict):
-        raw = json.dumps(msg).encode()
-        header = struct.pack(">I", len(raw))
+        await self.broadcast_except(None, msg)
 
-        dead_peers = []
+    async def broadcast_except(self, excluded_peer_id, msg, legacy_msg=None):
+        """
+        Encodes once per wire format and enqueues to every peer; never
+        waits on a peer. Version 1 peers get legacy_msg instead, if set.
+        """
+        frames = {}
 
-        for peer_id, peer in list(self.peers.items()):
-            try:
-                peer.writer.write(header + raw)
-                ok = await asyncio.wait_for(peer.writer.drain(), timeout=3)
-            except Exception as e:
-                print(f"Broadcast failed {peer_id}: {e}")
-                dead_peers.append(peer_id)
+        for pid, peer in list(self.peers.items()):
+            if pid == excluded_peer_id:
+                continue
+
+            out = legacy_msg if legacy_msg is not None and peer.version < 2 else msg
+            key = (peer.features, out is msg)
+            if key not in frames:
+                frames[key] = self.encode_frame(out, peer.features)
+            peer.enqueue(frames[key], MESSAGE_LANES.get(out.get("type"), CONSENSUS))
+
+    async def send_to(self, peer_id, msg: dict):
+        """Queues msg for one peer in its lane; sync pages wait for room"""
+        peer = self.peers.get(peer_id)
+        if peer is None:
+            return False
 
-        for peer_id in dead_peers:
-            self.peers.pop(peer_id, None)
+        frame = self.encode_frame(msg, peer.features)
+        lane = MESSAGE_LANES.get(msg.get("type"), CONSENSUS)
+
+        if lane == SYNC:
+            return await peer.put(frame, lane)
+        return peer.enqueue(frame, lane)
+
+    def queue_stats(self) -> dict:
+        return {pid: peer.stats() for pid, peer in self.peers.items()}
 
     async def listen_peer(self, peer_id, reader, writer):
         try:
@@ -160,13 +373,11 @@ class P2PNetwork:
         except Exception as e:
             print(f"Peer {peer_id} disconnected", e)
         finally:
-            self.peers.pop(peer_id, None)
+            self.remove_peer(peer_id, writer)
             writer.close()
 
     async def send(self, writer, msg: dict):
-        raw = json.dumps(msg).encode()
-        header = struct.pack(">I", len(raw))
-        writer.write(header + raw)
+        writer.write(self.encode_frame(msg))
 
         try:
             await asyncio.wait_for(writer.drain(), timeout=3)
@@ -179,7 +390,18 @@ class P2PNetwork:
         if size > MAX_MSG_SIZE:
             raise ValueError(f"Message too large: {size} bytes")
         payload = await reader.readexactly(size)
-        return json.loads(payload.decode())
+
+        if size < DECODE_OFFLOAD_MIN:
+            return decode_frame(payload, MAX_MSG_SIZE)
+
+        # Readers wait here while the pool is busy, which leaves further
+        # frames in their sockets instead of in memory
+        async with self.decode_slots:
+            if self.decoder is None:
+                self.decoder = ProcessPoolExecutor(max_workers=DECODE_WORKERS)
+
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.decoder, decode_frame, payload, MAX_MSG_SIZE)
 
     async def handle_message(self, peer_id, msg):
         if msg["type"] == "status":
@@ -188,21 +410,52 @@ class P2PNetwork:
         elif msg["type"] == "get_blocks":
             await self.on_get_blocks(peer_id, msg)
 
+        elif msg["type"] == "get_headers":
+            await self.on_get_headers(peer_id, msg)
+
+        elif msg["type"] == "headers":
+            await self.range_sync.on_headers(peer_id, msg)
+
         elif msg["type"] == "blocks":
             await self.on_blocks(peer_id, msg)
 
         elif msg["type"] == "block":
             await self.on_block(peer_id, msg)
 
+        elif msg["type"] == "cmpct_block":
+            await self.on_compact_block(peer_id, msg)
+
+        elif msg["type"] == "get_block_txs":
+            await self.on_get_block_txs(peer_id, msg)
+
+        elif msg["type"] == "block_txs":
+            await self.on_block_txs(peer_id, msg)
+
         elif msg["type"] == "get_block":
             await self.on_get_block(peer_id, msg)
 
         elif msg["type"] == "single_block":
             await self.on_single_block(peer_id, msg)
 
+        elif msg["type"] == "inv":
+            await self.on_inv(peer_id, msg)
+
+        elif msg["type"] == "getdata":
+            await self.on_getdata(peer_id, msg)
+
         elif msg["type"] == "tx":
             tx = msg["data"]
 
+            # The sender has it: never announce it back
+            peer = self.peers.get(peer_id)
+            if peer is not None and tx.get("txid"):
+                peer.mark_known(tx["txid"])
+            self.requested.pop(tx.get("txid"), None)
+
+            self.gossip_stats["tx_received"] += 1
+            if self.mempool.contains(tx.get("txid")):
+                self.gossip_stats["tx_duplicate"] += 1
+
             # --------------------------------------------------
             # FLARE REVEAL (special protocol tx)
             # --------------------------------------------------
@@ -213,16 +466,14 @@ class P2PNetwork:
                     if k not in tx:
                         return
 
-                added = self.mempool.add(tx)
+                # an unverified reveal is kept, but ranks as a 0-fee tx
+                added = self.mempool.add(tx, verified=self.verified_reveal(tx))
                 if not added:
                     return
 
                 print(f"Accepted FLARE_REVEAL TX: {tx['txid']}")
 
-                await self.broadcast_except(peer_id, {
-                    "type": "tx",
-                    "data": tx
-                })
+                self.announce(tx["txid"], peer_id)
                 return
 
             required_common = ("txid", "action", "amount", "chainId", "asset")
@@ -248,20 +499,22 @@ class P2PNetwork:
             if not tx.get("timestamp"):
                 tx["timestamp"] = int(time.time())
 
+            error = await self.admission_error(tx)
+            if error:
+                print(f"Rejected TX through gossip: {tx['txid']} ({error})")
+                return
+
             added = self.mempool.add(tx)
             if not added:
                 return
 
             print(f"Accepted TX through gossip: {tx['txid']}")
 
-            # Broadcast (fan-out)
-            await self.broadcast_except(peer_id, {
-                "type": "tx",
-                "data": tx
-            })
+            # Fan-out by inventory: peers fetch the body only if they lack it
+            self.announce(tx["txid"], peer_id)
 
         elif msg["type"] == "ping":
-            await self.send(self.peers[peer_id].writer, {"type": "pong"})
+            await self.send_to(peer_id, {"type": "pong"})
 
         elif msg["type"] == "pong":
             pass
@@ -275,18 +528,112 @@ class P2PNetwork:
 
     async def heartbeat(self):
         while True:
-            dead = []
-            for peer_id, peer in list(self.peers.items()):
-                try:
-                    await self.send(peer.writer, {"type": "ping", "version": '1.0', "timestamp": time.time()})
-                except:
-                    dead.append(peer_id)
+            # Dead peers are removed by their writer task
+            await self.broadcast({"type": "ping", "version": '1.0', "timestamp": time.time()})
+
+            stats = self.queue_stats()
+            if any(sum(s["depth"]) or s["dropped"] for s in stats.values()):
+                print("Peer queues:", stats)
 
-            for pid in dead:
-                self.peers.pop(pid, None)
+            if self.gossip_stats["tx_received"]:
+                print("Gossip:", self.gossip_stats)
 
             await asyncio.sleep(10)
 
+    # --------------------
+    # TX INVENTORY
+    # --------------------
+
+    def announce(self, txid, excluded_peer_id=None):
+        """Queues txid for the next inv to every peer not known to have it"""
+        for pid, peer in self.peers.items():
+            if pid == excluded_peer_id or peer.knows(txid):
+                continue
+            peer.inv_pending.append(txid)
+
+    async def inv_loop(self, interval=INV_INTERVAL):
+        while True:
+            await asyncio.sleep(interval)
+
+            for peer in list(self.peers.values()):
+                pending, peer.inv_pending = peer.inv_pending, []
+                pending = [
+                    txid for txid in dict.fromkeys(pending)
+                    if not peer.knows(txid) and self.mempool.contains(txid)
+                ]
+
+                if peer.version < 2:
+                    self.push_txs(peer, pending)
+                    continue
+
+                for i in range(0, len(pending), INV_BATCH):
+                    batch = pending[i:i + INV_BATCH]
+                    frame = self.encode_frame({"type": "inv", "txids": batch}, peer.features)
+
+                    if not peer.enqueue(frame, GOSSIP):
+                        # gossip lane full: announced again on a later flush
+                        peer.inv_pending.extend(pending[i:])
+                        break
+
+                    # known only once the announcement is queued for sure
+                    for txid in batch:
+                        peer.mark_known(txid)
+                    self.gossip_stats["inv_sent"] += 1
+
+    def push_txs(self, peer, txids):
+        """Full txs for version 1 peers, which know no inv / getdata"""
+        for n, txid in enumerate(txids):
+            tx = self.mempool.get(txid)
+            if tx is None:
+                continue
+
+            if not peer.enqueue(self.encode_frame({"type": "tx", "data": tx}, peer.features), GOSSIP):
+                peer.inv_pending.extend(txids[n:])
+                return
+            peer.mark_known(txid)
+
+    async def on_inv(self, peer_id, msg):
+        peer = self.peers.get(peer_id)
+        if peer is None:
+            return
+
+        now = time.time()
+        wanted = []
+
+        for txid in msg.get("txids", [])[:INV_BATCH]:
+            peer.mark_known(txid)
+
+            if self.mempool.contains(txid):
+                continue
+            if now - self.requested.get(txid, 0) < GETDATA_TIMEOUT:
+                continue  # already asked another peer
+
+            self.requested[txid] = now
+            wanted.append(txid)
+
+        if len(self.requested) > 10 * INV_BATCH:
+            self.requested = {
+                txid: at for txid, at in self.requested.items()
+                if now - at < GETDATA_TIMEOUT
+            }
+
+        if wanted:
+            self.gossip_stats["getdata_sent"] += 1
+            await self.send_to(peer_id, {"type": "getdata", "txids": wanted})
+
+    async def on_getdata(self, peer_id, msg):
+        peer = self.peers.get(peer_id)
+        if peer is None:
+            return
+
+        for txid in msg.get("txids", [])[:INV_BATCH]:
+            tx = self.mempool.get(txid)
+            if tx is None:
+                continue
+
+            peer.mark_known(txid)
+            await self.send_to(peer_id, {"type": "tx", "data": tx})
+
     async def on_get_block(self, peer_id, msg):
         index = msg["index"]
 
@@ -295,7 +642,7 @@ class P2PNetwork:
 
         block = self.chain[index]
 
-        await self.send(self.peers[peer_id].writer, {
+        await self.send_to(peer_id, {
             "type": "single_block",
             "data": block.to_dict()
         })
@@ -303,7 +650,8 @@ class P2PNetwork:
     async def on_single_block(self, peer_id, msg):
         incoming_block = Block.from_dict(msg["data"])
 
-        if not self.chain:
+        # The tip may be mid-replacement by the sync task
+        if not self.chain or self.syncing:
             return
 
         local_block = self.chain[-1]
@@ -324,6 +672,7 @@ class P2PNetwork:
         if not self.validator.validate(local_block, prev_block, chain_until_prev):
             print("Local block is invalid, rolling back")
             self.chain[-1] = incoming_block
+            self.chain_changed()
             self.storage.save(self.chain)
             return
 
@@ -344,6 +693,7 @@ class P2PNetwork:
                 return
 
             self.chain[-1] = incoming_block
+            self.chain_changed()
             self.storage.save(self.chain)
             self.prune_registry()
 
@@ -356,6 +706,8 @@ class P2PNetwork:
         peer_index = msg["latest_index"]
         peer_hash = msg.get("latest_hash")
 
+        self.range_sync.note_height(peer_id, peer_index, peer_hash)
+
         if self.syncing and self.sync_target and peer_index <= self.sync_target:
             return
 
@@ -377,10 +729,7 @@ class P2PNetwork:
             self.syncing = True
             self.sync_target = peer_index
             print("Local node is behind, requesting blocks")
-            await self.send(self.peers[peer_id].writer, {
-                "type": "get_blocks",
-                "from": local_index + 1
-            })
+            self.range_sync.start(peer_index)
             return
 
 
@@ -392,108 +741,281 @@ class P2PNetwork:
         if peer_index == local_index and peer_hash != local_hash:
             print("Fork detected, comparing final blocks")
 
-            await self.send(self.peers[peer_id].writer, {
+            await self.send_to(peer_id, {
                 "type": "get_block",
                 "index": local_index
             })
             return
 
+    async def on_get_headers(self, peer_id, msg):
+        from_index = max(0, msg["from"])
+        if isinstance(msg.get("locator"), list):
+            # start right after the last block both chains share
+            from_index = find_ancestor(self.chain, msg["locator"]) + 1
+        count = min(msg.get("count", SYNC_HEADERS_PAGE), SYNC_HEADERS_PAGE)
+
+        await self.send_to(peer_id, {
+            "type": "headers",
+            "from": from_index,
+            "data": [b.header() for b in self.chain[from_index:from_index + count]]
+        })
+
     async def on_get_blocks(self, peer_id, msg):
         from_index = msg["from"]
+        to_index = msg.get("to")  # inclusive, set by range sync
 
         print(f"Sending blocks from index {from_index} to {peer_id}")
 
-        blocks = self.chain[from_index:]
+        if to_index is None:
+            blocks = self.chain[from_index:]
+        else:
+            blocks = self.chain[from_index:to_index + 1]
 
         if not blocks:
             # Peer is already up to date: send empty last page to finalize sync
-            await self.send(self.peers[peer_id].writer, {
+            await self.send_to(peer_id, {
                 "type": "blocks",
+                "from": from_index,
                 "data": []
             })
             return
 
         for i in range(0, len(blocks), BLOCKS_PER_PAGE):
             chunk = blocks[i:i + BLOCKS_PER_PAGE]
-            await self.send(self.peers[peer_id].writer, {
+            await self.send_to(peer_id, {
                 "type": "blocks",
+                "from": from_index + i,
                 "data": [b.to_dict() for b in chunk]
             })
 
     async def on_blocks(self, peer_id, msg):
-        received = msg["data"]
-        print(f"Received {len(received)} blocks from {peer_id}")
+        blocks = msg["data"]  # parsed by decode_frame()
+        print(f"Received {len(blocks)} blocks from {peer_id}")
+
+        # Answers to range requests are applied by the sync task, in order;
+        # while it runs, nothing else appends or finishes the sync
+        if self.range_sync.on_chunk(peer_id, msg) or self.range_sync.active:
+            return
+
+        if not await self.apply_synced_blocks(blocks):
+            return
+
+        if msg["error"]:
+            raise msg["error"]
+
+        # Finalize sync only on the last page (partial chunk = no more pages)
+        if len(blocks) >= BLOCKS_PER_PAGE:
+            return
+
+        self.finish_sync()
+
+    def finish_sync(self):
+        self.syncing = False
+        self.sync_target = None
+
+        # Process blocks that arrived during sync
+        self.buffered_blocks.sort(key=lambda b: b.index)
+        remaining_buffer = []
+
+        for block in self.buffered_blocks:
+            local_tip = self.chain[-1].index
+            if block.index == local_tip + 1:
+                prev = self.chain[-1]
+                if self.validator.validate(block, prev, self.chain):
+                    self.chain.append(block)
+                    included = {tx["txid"] for tx in block.transactions}
+                    self.mempool.remove_many(included)
+                    print(f"Block #{block.index} added (buffer)")
+                else:
+                    print(f"Block #{block.index} invalid (from buffer), discarded")
+            elif block.index > local_tip + 1:
+                remaining_buffer.append(block)
+
+        self.buffered_blocks = remaining_buffer
+
+        print("Sync completed")
+        self.chain_changed()
+        self.storage.save(self.chain)
+        self.prune_registry()
+
+    async def apply_synced_blocks(self, blocks):
+        """
+        append_synced_blocks() for a page, yielding to the loop every
+        APPLY_SLICE seconds. Signatures of the whole page are verified in
+        parallel up front, continuity / leader / state checks stay
+        sequential. Live blocks are buffered while syncing, so nothing
+        else changes the chain in between.
+        """
+        preverified = await self.validator.preverify(blocks)
+        try:
+            slice_started = time.perf_counter()
+
+            for block in blocks:
+                if not self.append_synced_blocks([block]):
+                    return False
 
-        for raw in received:
-            block = Block.from_dict(raw)
+                if time.perf_counter() - slice_started >= APPLY_SLICE:
+                    await asyncio.sleep(0)
+                    slice_started = time.perf_counter()
+
+            return True
+        finally:
+            # header verification may share the cache across the yields
+            self.validator.verifier.discard(preverified)
+
+    def append_synced_blocks(self, blocks):
+        """Validates and appends a sync page in order, False on the first failure"""
+        for block in blocks:
 
             # Genesis case
             if not self.chain:
                 if block.index != 0:
                     print("Expected genesis, received something else")
-                    return
+                    return False
 
                 if not self.validator.validate(block, None, []):
                     print("Invalid genesis")
-                    return
+                    return False
 
                 # Equivocation check
                 if not self.register_block(block):
                     print("DOUBLE SIGNING DETECTED")
-                    return
+                    return False
 
                 self.chain.append(block)
                 print("Genesis received and added")
                 continue
 
-            chain_until_prev = self.chain[:]
+            # validate() is synchronous, so the live chain is a valid prefix
+            chain_until_prev = self.chain
             prev = chain_until_prev[-1]
 
             if not self.validator.validate(block, prev, chain_until_prev):
                 print("Sync failed: invalid block")
-                return
+                return False
 
             if block.prev_hash != prev.hash:
                 print("Long fork detected, sync aborted")
-                return
+                return False
 
             # Equivocation check
             if not self.register_block(block):
                 print("DOUBLE SIGNING DETECTED")
-                return
+                return False
 
             self.chain.append(block)
 
-        # Finalize sync only on the last page (partial chunk = no more pages)
-        if len(received) >= BLOCKS_PER_PAGE:
+        return True
+
+    # --------------------
+    # COMPACT BLOCKS
+    # --------------------
+
+    async def broadcast_block(self, block):
+        """
+        Announces a new block as header + tx references. Txs peers have
+        from gossip travel as txid + digest, the rest in full. Version 1
+        peers know no compact blocks and get the full block.
+        """
+        data = block.to_dict()
+        compact = compact_block(data, self.mempool.contains)
+        await self.broadcast_except(
+            None,
+            {"type": "cmpct_block", "data": compact},
+            legacy_msg={"type": "block", "data": data}
+        )
+
+        short = sum(1 for entry in compact["entries"] if "tx" not in entry)
+        print(f"Compact block #{block.index}: {short}/{len(compact['entries'])} txs by reference")
+
+    async def on_compact_block(self, peer_id, msg):
+        compact = msg["data"]
+
+        if self.chain and compact["index"] <= self.chain[-1].index:
             return
 
-        self.syncing = False
-        self.sync_target = None
+        txs, missing = rebuild_txs(compact, self.mempool.get)
+
+        if missing:
+            now = time.time()
+            self.pending_compact = {
+                h: pending for h, pending in self.pending_compact.items()
+                if now - pending["received_at"] < COMPACT_PENDING_TTL
+            }
+            self.pending_compact[compact["hash"]] = {
+                "compact": compact,
+                "txs": txs,
+                "received_at": now,
+            }
+
+            print(f"Compact block #{compact['index']}: requesting {len(missing)}/{len(txs)} txs")
+            await self.send_to(peer_id, {
+                "type": "get_block_txs",
+                "hash": compact["hash"],
+                "indexes": missing
+            })
+            return
 
-        # Process blocks that arrived during sync
-        self.buffered_blocks.sort(key=lambda b: b.index)
-        remaining_buffer = []
+        await self.accept_compact(peer_id, compact, txs)
 
-        for block in self.buffered_blocks:
-            local_tip = self.chain[-1].index
-            if block.index == local_tip + 1:
-                prev = self.chain[-1]
-                if self.validator.validate(block, prev, self.chain[:]):
-                    self.chain.append(block)
-                    included = {tx["txid"] for tx in block.transactions}
-                    self.mempool.remove_many(included)
-                    print(f"Block #{block.index} added (buffer)")
-                else:
-                    print(f"Block #{block.index} invalid (from buffer), discarded")
-            else:
-                remaining_buffer.append(block)
+    async def on_get_block_txs(self, peer_id, msg):
+        block = next(
+            (b for b in reversed(self.chain[-SERVED_BLOCKS_DEPTH:]) if b.hash == msg["hash"]),
+            None
+        )
+        if block is None:
+            return
 
-        self.buffered_blocks = remaining_buffer
+        indexes = [i for i in msg["indexes"] if 0 <= i < len(block.transactions)]
 
-        print("Sync completed")
-        self.storage.save(self.chain)
-        self.prune_registry()
+        await self.send_to(peer_id, {
+            "type": "block_txs",
+            "hash": block.hash,
+            "txs": [[i, block.transactions[i]] for i in indexes]
+        })
+
+    async def on_block_txs(self, peer_id, msg):
+        pending = self.pending_compact.pop(msg["hash"], None)
+        if pending is None:
+            return
+
+        txs = pending["txs"]
+        for i, tx in msg["txs"]:
+            if 0 <= i < len(txs):
+                txs[i] = tx
+
+        if any(tx is None for tx in txs):
+            print(f"Compact block #{pending['compact']['index']}: peer did not send every tx, dropped")
+            return
+
+        await self.accept_compact(peer_id, pending["compact"], txs, retry=not pending.get("full"))
+
+    async def accept_compact(self, peer_id, compact, txs, retry=True):
+        data = block_dict_from(compact, txs)
+
+        try:
+            Block.from_dict(data)  # recomputes and checks the hash
+        except Exception as e:
+            if not retry:
+                print(f"Compact block #{compact['index']} invalid: {e}")
+                return
+
+            # A mempool copy did not match what the leader had: fetch every tx
+            print(f"Compact block #{compact['index']} rebuild failed ({e}), requesting all txs")
+            self.pending_compact[compact["hash"]] = {
+                "compact": compact,
+                "txs": [None] * len(txs),
+                "received_at": time.time(),
+                "full": True,
+            }
+            await self.send_to(peer_id, {
+                "type": "get_block_txs",
+                "hash": compact["hash"],
+                "indexes": list(range(len(txs)))
+            })
+            return
+
+        await self.on_block(peer_id, {"data": data})
 
     async def on_block(self, peer_id, msg):
         block = Block.from_dict(msg["data"])
@@ -503,9 +1025,15 @@ class P2PNetwork:
         if block.index <= local_tip:
             return
 
+        # The sync task appends in slices: kept until it is done
+        if self.syncing:
+            print(f"Buffering block #{block.index} (sync in progress)")
+            self.buffered_blocks.append(block)
+            return
+
         # Happy case: next block
         if block.index == local_tip + 1:
-            chain_until_prev = self.chain[:]  # safe snapshot
+            chain_until_prev = self.chain  # validate() does not yield
             prev = chain_until_prev[-1]
 
             if not self.validator.validate(block, prev, chain_until_prev):
@@ -518,6 +1046,7 @@ class P2PNetwork:
                 return
 
             self.chain.append(block)
+            self.chain_changed()
             self.storage.save(self.chain)
             self.prune_registry()
 
@@ -532,31 +1061,8 @@ class P2PNetwork:
             f"GAP detected: local={local_tip}, received={block.index}"
         )
 
-        if self.syncing:
-            print(f"Buffering block #{block.index} (sync in progress)")
-            self.buffered_blocks.append(block)
-            return
-
         self.syncing = True
-        await self.send(self.peers[peer_id].writer, {
-            "type": "get_blocks",
-            "from": local_tip + 1
-        })
-
-    async def broadcast_except(self, excluded_peer_id, msg):
-        raw = json.dumps(msg).encode()
-        header = struct.pack(">I", len(raw))
-
-        dead = []
-
-        for pid, peer in list(self.peers.items()):
-            if pid == excluded_peer_id:
-                continue
-            try:
-                peer.writer.write(header + raw)
-                await asyncio.wait_for(peer.writer.drain(), timeout=3)
-            except Exception:
-                dead.append(pid)
-
-        for pid in dead:
-            self.peers.pop(pid, None)
\ No newline at end of file
+        self.sync_target = block.index - 1
+        self.buffered_blocks.append(block)
+        self.range_sync.note_height(peer_id, block.index, block.hash)
+        self.range_sync.start(block.index - 1)
@@ -1,6 +1,133 @@
 # core/peer.py
 
+import asyncio
+from collections import OrderedDict, deque
+
+PEER_QUEUE_SIZE = 256  # queued outbound frames per lane before gossip is dropped / sync waits
+SEND_TIMEOUT = 3  # seconds a single drain may take before the peer is dropped
+KNOWN_TXS_SIZE = 20_000  # txids remembered per peer as already known to it
+
+# Outbound lanes, drained strictly in this order
+CONSENSUS = 0  # block, single_block, status, ping
+SYNC = 1       # get_headers, headers, get_blocks, blocks, get_block
+GOSSIP = 2     # tx, inv, getdata
+LANES = (CONSENSUS, SYNC, GOSSIP)
+
+
 class Peer:
-    def __init__(self, node_id: str, writer):
+    """
+    A connected node and its outbound lanes.
+
+    Broadcasts only enqueue; a writer task per peer drains the lanes,
+    always the highest-priority non-empty one first, so a slow peer
+    delays nobody but itself and a tx flood never sits in front of a
+    block. The gossip lane drops frames once full, the consensus lane is
+    never bounded, and senders of sync pages wait for room (put()).
+    A peer that cannot drain within SEND_TIMEOUT is closed.
+    """
+
+    def __init__(self, node_id: str, writer, queue_size=PEER_QUEUE_SIZE, features=frozenset(), version=1):
         self.node_id = node_id
         self.writer = writer
+        self.features = features  # wire features agreed in the handshake (core/wire.py)
+        self.version = version  # protocol version from its handshake
+        self.queue_size = queue_size
+        self.lanes = [deque() for _ in LANES]
+        self.wakeup = asyncio.Event()
+        self.drained = asyncio.Event()
+        self.task = None
+        self.closed = False
+
+        # txids the peer has or was told about (LRU), and txids to announce
+        self.known_txs = OrderedDict()
+        self.inv_pending = []
+
+        self.sent = [0 for _ in LANES]
+        self.dropped = 0
+        self.max_depth = [0 for _ in LANES]
+
+    def knows(self, txid) -> bool:
+        return txid in self.known_txs
+
+    def mark_known(self, txid):
+        self.known_txs[txid] = None
+        self.known_txs.move_to_end(txid)
+        while len(self.known_txs) > KNOWN_TXS_SIZE:
+            self.known_txs.popitem(last=False)
+
+    def start(self, on_close=None):
+        self.task = asyncio.create_task(self.run(on_close))
+
+    def enqueue(self, frame: bytes, lane=CONSENSUS) -> bool:
+        if self.closed:
+            return False
+
+        queue = self.lanes[lane]
+
+        if lane == GOSSIP and len(queue) >= self.queue_size:
+            self.dropped += 1
+            return False
+
+        queue.append(frame)
+        self.max_depth[lane] = max(self.max_depth[lane], len(queue))
+        self.wakeup.set()
+        return True
+
+    async def put(self, frame: bytes, lane=SYNC) -> bool:
+        """Enqueues, first waiting while the lane is full (backpressure for bulk senders)"""
+        while not self.closed and len(self.lanes[lane]) >= self.queue_size:
+            self.drained.clear()
+            await self.drained.wait()
+
+        return self.enqueue(frame, lane)
+
+    def next_frame(self):
+        for lane, queue in enumerate(self.lanes):
+            if queue:
+                return queue.popleft(), lane
+        return None, None
+
+    async def run(self, on_close=None):
+        try:
+            while True:
+                frame, lane = self.next_frame()
+
+                if frame is None:
+                    self.wakeup.clear()
+                    await self.wakeup.wait()
+                    continue
+
+                self.writer.write(frame)
+                self.drained.set()
+                await asyncio.wait_for(self.writer.drain(), timeout=SEND_TIMEOUT)
+                self.sent[lane] += 1
+
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"Send to {self.node_id} failed: {e!r}")
+        finally:
+            self.close()
+            if on_close:
+                on_close(self)
+
+    def close(self):
+        if self.closed:
+            return
+
+        self.closed = True
+        for queue in self.lanes:
+            queue.clear()
+        self.drained.set()
+        self.writer.close()
+
+        if self.task and self.task is not asyncio.current_task():
+            self.task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "depth": [len(queue) for queue in self.lanes],
+            "max_depth": list(self.max_depth),
+            "sent": list(self.sent),
+            "dropped": self.dropped,
+        }
@@ -0,0 +1,139 @@
+# core/sender_recovery.py
+
+import asyncio
+import hashlib
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from core.tx_engine import recover_sender, signed_message
+
+PARALLEL_MIN_BATCH = 16  # below this, recovering inline beats the IPC round trip
+RECOVERY_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+RECOVERY_CACHE_SIZE = 50_000  # recovered senders kept (LRU)
+
+
+def cache_key(message: str, signature):
+    """
+    Recovery is a pure function of (signed message, signature), so an
+    entry under this key can never go stale.
+    """
+    return hashlib.sha256(message.encode()).digest(), signature
+
+
+def recover_batch(items: list) -> list:
+    """
+    Worker entrypoint: [(message, signature)] -> [address | None].
+    None marks an item that raised; it is left to the inline path so
+    a bad signature fails exactly as before.
+    """
+    results = []
+    for message, signature in items:
+        try:
+            results.append(recover_sender(message, signature))
+        except Exception:
+            results.append(None)
+    return results
+
+
+class SenderRecovery:
+    """
+    secp256k1 sender recovery for user txs across a process pool.
+    prerecover() fills results for a whole batch; the serial nonce and
+    balance checks then read them through recover().
+
+    Results live in a bounded LRU cache shared by every path of the
+    process (tx admission and block building), so a tx held back for a
+    nonce gap is not recovered again on every slot. Only successful
+    recoveries are cached: failures keep raising as before.
+    """
+
+    def __init__(self, workers=RECOVERY_WORKERS, cache_size=RECOVERY_CACHE_SIZE):
+        self.workers = workers
+        self.executor = None
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get_executor(self):
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self.executor
+
+    def lookup(self, key):
+        recovered = self.cache.get(key)
+        if recovered is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.cache.move_to_end(key)
+        return recovered
+
+    def store(self, key, recovered: str):
+        self.cache[key] = recovered
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def recover(self, message: str, signature) -> str:
+        key = cache_key(message, signature)
+        recovered = self.lookup(key)
+        if recovered is not None:
+            return recovered
+
+        recovered = recover_sender(message, signature)
+        self.store(key, recovered)
+        return recovered
+
+    async def recover_one(self, message: str, signature) -> str:
+        """Single recovery off the event loop (API submission)"""
+        key = cache_key(message, signature)
+        recovered = self.lookup(key)
+        if recovered is not None:
+            return recovered
+
+        loop = asyncio.get_running_loop()
+        recovered = await loop.run_in_executor(self.get_executor(), recover_sender, message, signature)
+        self.store(key, recovered)
+        return recovered
+
+    async def prerecover(self, txs: list):
+        items = []
+        for tx in txs:
+            meta = tx.get("_meta")
+            if not meta or not isinstance(meta.get("signature"), (str, bytes)):
+                continue
+            try:
+                items.append((signed_message(tx), meta["signature"]))
+            except Exception:
+                continue
+
+        items = [
+            item for item in dict.fromkeys(items)
+            if cache_key(*item) not in self.cache
+        ]
+
+        if len(items) < PARALLEL_MIN_BATCH:
+            return
+
+        loop = asyncio.get_running_loop()
+        size = -(-len(items) // self.workers)
+        chunks = [items[i:i + size] for i in range(0, len(items), size)]
+
+        outcomes = await asyncio.gather(*(
+            loop.run_in_executor(self.get_executor(), recover_batch, chunk)
+            for chunk in chunks
+        ))
+
+        for chunk, results in zip(chunks, outcomes):
+            for item, recovered in zip(chunk, results):
+                if recovered is not None:
+                    self.store(cache_key(*item), recovered)
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.cache)}
+
+    def clear(self):
+        self.cache.clear()
@@ -0,0 +1,96 @@
+# core/signature_verifier.py
+
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from nacl.signing import VerifyKey
+from nacl.encoding import RawEncoder
+from nacl.exceptions import BadSignatureError
+
+PARALLEL_MIN_BATCH = 64  # below this, verifying inline beats the IPC round trip
+VERIFY_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+
+
+@lru_cache(maxsize=1024)
+def get_verify_key(pubkey: bytes) -> VerifyKey:
+    """One VerifyKey per validator / oracle pubkey"""
+    return VerifyKey(pubkey, encoder=RawEncoder)
+
+
+def verify_ed25519(pubkey: bytes, message: bytes, signature: bytes) -> bool:
+    try:
+        get_verify_key(pubkey).verify(message, signature)
+        return True
+    except BadSignatureError:
+        return False
+
+
+def verify_batch(items: list) -> list:
+    """
+    Worker entrypoint: [(pubkey, message, signature)] -> [True | False | None].
+    None marks an item that raised; it is left to the inline path so
+    malformed input fails exactly as before.
+    """
+    results = []
+    for pubkey, message, signature in items:
+        try:
+            results.append(verify_ed25519(pubkey, message, signature))
+        except Exception:
+            results.append(None)
+    return results
+
+
+class SignatureVerifier:
+    """
+    Verifies ed25519 signatures of a whole page up front in a process
+    pool. Sequential checks then read the precomputed results through
+    verify(), falling back to inline verification for anything missing.
+    """
+
+    def __init__(self, workers=VERIFY_WORKERS):
+        self.workers = workers
+        self.executor = None
+        self.results = {}
+
+    def verify(self, pubkey: bytes, message: bytes, signature: bytes) -> bool:
+        result = self.results.get((pubkey, message, signature))
+        if result is not None:
+            return result
+        return verify_ed25519(pubkey, message, signature)
+
+    async def preverify(self, items: list) -> list:
+        """Caches the results of items not cached yet and returns those items"""
+        items = [item for item in dict.fromkeys(items) if item not in self.results]
+
+        if len(items) < PARALLEL_MIN_BATCH:
+            return []
+
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+
+        loop = asyncio.get_running_loop()
+        size = -(-len(items) // self.workers)
+        chunks = [items[i:i + size] for i in range(0, len(items), size)]
+
+        outcomes = await asyncio.gather(*(
+            loop.run_in_executor(self.executor, verify_batch, chunk)
+            for chunk in chunks
+        ))
+
+        added = []
+        for chunk, results in zip(chunks, outcomes):
+            for item, ok in zip(chunk, results):
+                if ok is not None:
+                    self.results[item] = ok
+                    added.append(item)
+        return added
+
+    def clear(self):
+        self.results.clear()
+
+    def discard(self, items: list):
+        """Drops the results preverify() returned, leaving other callers' in place"""
+        for item in items:
+            self.results.pop(item, None)
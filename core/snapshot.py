@@ -0,0 +1,130 @@
+# core/snapshot.py
+import copy
+
+from core.state import apply_block_state, empty_state
+from core.storage import DATA_DIR, write_atomic
+from core.tx_engine import TransactionEngine
+
+SNAPSHOT_DIR = DATA_DIR / "snapshots"
+SNAPSHOT_INTERVAL = 1000  # blocks between two snapshots
+SNAPSHOT_KEEP = 3  # newest snapshots kept on disk
+REPLAY_BATCH = 500  # blocks decrypted per storage read while replaying
+
+
+class SnapshotStore:
+    """
+    Encrypted state snapshots (balances, nonces, pools) taken at
+    checkpoint heights. A snapshot is only trusted if the block hash it
+    was taken at is still the block stored at that height.
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.crypto = storage.crypto
+        self.cached = None  # last restored (index, hash, state)
+
+    def path_for(self, index: int):
+        return SNAPSHOT_DIR / f"state_{index:012d}.enc"
+
+    def indexes(self) -> list:
+        """Snapshot heights on disk, newest first"""
+        if not SNAPSHOT_DIR.exists():
+            return []
+
+        found = []
+        for path in SNAPSHOT_DIR.glob("state_*.enc"):
+            try:
+                found.append(int(path.stem.split("_")[1]))
+            except ValueError:
+                continue
+
+        return sorted(found, reverse=True)
+
+    def save(self, index: int, block_hash: str, state: dict):
+        SNAPSHOT_DIR.mkdir(parents=True, exist_ok=True)
+
+        write_atomic(self.path_for(index), self.crypto.encrypt({
+            "index": index,
+            "hash": block_hash,
+            "balances": state["balances"],
+            "nonces": state["nonces"],
+            "pools": state["pools"],
+        }))
+
+        for old in self.indexes()[SNAPSHOT_KEEP:]:
+            self.path_for(old).unlink(missing_ok=True)
+
+    def latest(self, max_index=None):
+        """Newest snapshot at or below max_index that matches the stored chain"""
+        for index in self.indexes():
+            if max_index is not None and index > max_index:
+                continue
+
+            try:
+                snapshot = self.crypto.decrypt(self.path_for(index).read_bytes())
+            except Exception as e:
+                print(f"Snapshot #{index} unreadable, skipping: {e}")
+                continue
+
+            if self.storage.hash_at(index) == snapshot["hash"]:
+                return snapshot
+
+        return None
+
+    def restore(self, protocol, upto=None):
+        """
+        Returns (state, index): the state after block `upto` (default: tip),
+        rebuilt from the newest usable snapshot plus the blocks after it.
+        """
+        if upto is None:
+            upto = self.storage.height() - 1
+
+        start = 0
+        state = empty_state()
+        tip_hash = None
+
+        snapshot = self.latest(upto)
+        if snapshot:
+            start = snapshot["index"] + 1
+            tip_hash = snapshot["hash"]
+            state = {
+                "balances": snapshot["balances"],
+                "nonces": snapshot["nonces"],
+                "pools": snapshot["pools"],
+            }
+
+        # A state restored earlier in this process can be extended instead
+        if self.cached:
+            index, block_hash, cached_state = self.cached
+            if start <= index + 1 <= upto + 1 and self.storage.hash_at(index) == block_hash:
+                start = index + 1
+                tip_hash = block_hash
+                state = copy.deepcopy(cached_state)
+
+        tx_engine = TransactionEngine()
+        for batch in range(start, upto + 1, REPLAY_BATCH):
+            for block in self.storage.get_range(batch, min(batch + REPLAY_BATCH, upto + 1)):
+                apply_block_state(state, block, protocol, tx_engine)
+                tip_hash = block["hash"]
+
+        if upto >= 0 and tip_hash:
+            self.cached = (upto, tip_hash, copy.deepcopy(state))
+
+        return state, upto
+
+    def checkpoint(self, protocol):
+        """
+        Writes the snapshot for the newest checkpoint height if it is
+        missing. Returns the snapshot (index, hash, state), or None if
+        nothing was done.
+        """
+        height = self.storage.height()
+        index = ((height - 1) // SNAPSHOT_INTERVAL) * SNAPSHOT_INTERVAL
+
+        if index <= 0 or index in self.indexes():
+            return None
+
+        state, _ = self.restore(protocol, index)
+        _, block_hash, _ = self.cached
+        self.save(index, block_hash, state)
+        return index, block_hash, state
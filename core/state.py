@@ -3,29 +3,110 @@
 from core.tx_engine import TransactionEngine
 from core.utils import get_protocol, is_system_tx
 
+
+def as_block_dict(block_data):
+    return block_data if isinstance(block_data, dict) else block_data.to_dict()
+
+
+# -----------------------------
+# PER-BLOCK APPLICATION
+# -----------------------------
+
+def apply_block_balances(balances, block_data, protocol, tx_engine=None):
+    """Apply the economic effects of a single block to balances (in place)"""
+    tx_engine = tx_engine or TransactionEngine()
+    block = as_block_dict(block_data)
+    validator = block.get("producer_id")
+
+    for tx in block.get("transactions", []):
+
+        # Skip non-economic transactions
+        if tx.get("action") == "flare_reveal":
+            continue
+
+        tx_engine.apply_tx(
+            balances,
+            tx,
+            system=is_system_tx(tx, protocol),
+            validator_address=validator,
+            protocol=protocol
+        )
+
+    return balances
+
+
+def apply_block_nonces(nonces, block_data, protocol):
+    block = as_block_dict(block_data)
+
+    for tx in block.get("transactions", []):
+        sender = tx.get("sender")
+        if not sender:
+            continue
+
+        if is_system_tx(tx, protocol):
+            continue
+
+        nonces[sender] = nonces.get(sender, 0) + 1
+
+    return nonces
+
+
+def apply_block_pools(pools, block_data):
+    """pools: { pool_id -> pool }"""
+    block = as_block_dict(block_data)
+
+    for tx in block.get("transactions", []):
+        action = tx.get("action")
+
+        if action == "add_liquidity":
+            pid = tx["pool_id"]
+
+            if pid not in pools:
+                pools[pid] = {
+                    "id": pid,
+                    "token0": tx["asset_paired"],
+                    "token1": tx["asset"],
+                    "reserve0": 0,
+                    "reserve1": 0,
+                    "fee": 0.003,
+                    "amm": "constant_product",
+                }
+
+            pools[pid]["reserve0"] += tx["amount_paired"]
+            pools[pid]["reserve1"] += tx["amount"]
+
+        #elif action == "swap":
+        #    pid = tx["pool_id"]
+        #    pools[pid] = PoolEngine.apply_swap(tx, pools[pid])
+
+    return pools
+
+
+def empty_state():
+    return {"balances": {}, "nonces": {}, "pools": {}}
+
+
+def apply_block_state(state, block_data, protocol, tx_engine=None):
+    """Apply a block to a full state dict (balances, nonces, pools)"""
+    block = as_block_dict(block_data)
+    apply_block_balances(state["balances"], block, protocol, tx_engine)
+    apply_block_nonces(state["nonces"], block, protocol)
+    apply_block_pools(state["pools"], block)
+    return state
+
+
+# -----------------------------
+# FULL REPLAY
+# -----------------------------
+
 def compute_balances(chain, protocol):
     """Compute final balances from the chain"""
     balances = {}
     tx_engine = TransactionEngine()
-    
+
     for block_data in chain:
-        block = block_data if isinstance(block_data, dict) else block_data.to_dict()
-        validator = block.get("producer_id")
-        
-        for tx in block.get("transactions", []):
-
-            # Skip non-economic transactions
-            if tx.get("action") == "flare_reveal":
-                continue
-
-            tx_engine.apply_tx(
-                balances,
-                tx,
-                system=is_system_tx(tx, protocol),
-                validator_address=validator,
-                protocol=protocol
-            )
-    
+        apply_block_balances(balances, block_data, protocol, tx_engine)
+
     return balances
 
 
@@ -33,8 +114,8 @@ def compute_spendable_balances(chain, pending_txs, protocol):
     """Compute spendable balances (chain + mempool)"""
     balances = compute_balances(chain, protocol)
     tx_engine = TransactionEngine()
-    
-    
+
+
     for tx in pending_txs:
         tx_engine.apply_tx(
             balances,
@@ -43,38 +124,14 @@ def compute_spendable_balances(chain, pending_txs, protocol):
             validator_address=None,
             protocol=protocol
         )
-    
+
     return balances
 
 def compute_pools(chain):
     pools = {}
 
     for block_data in chain:
-        block = block_data if isinstance(block_data, dict) else block_data.to_dict()
-
-        for tx in block.get("transactions", []):
-            action = tx.get("action")
-
-            if action == "add_liquidity":
-                pid = tx["pool_id"]
-
-                if pid not in pools:
-                    pools[pid] = {
-                        "id": pid,
-                        "token0": tx["asset_paired"],
-                        "token1": tx["asset"],
-                        "reserve0": 0,
-                        "reserve1": 0,
-                        "fee": 0.003,
-                        "amm": "constant_product",
-                    }
-
-                pools[pid]["reserve0"] += tx["amount_paired"]
-                pools[pid]["reserve1"] += tx["amount"]
-
-            #elif action == "swap":
-            #    pid = tx["pool_id"]
-            #    pools[pid] = PoolEngine.apply_swap(tx, pools[pid])
+        apply_block_pools(pools, block_data)
 
     return list(pools.values())
 
@@ -84,16 +141,6 @@ def compute_nonces(chain):
     protocol = get_protocol(chain)
 
     for block_data in chain:
-        block = block_data if isinstance(block_data, dict) else block_data.to_dict()
-
-        for tx in block.get("transactions", []):
-            sender = tx.get("sender")
-            if not sender:
-                continue
-
-            if is_system_tx(tx, protocol):
-                continue
-
-            nonces[sender] = nonces.get(sender, 0) + 1
+        apply_block_nonces(nonces, block_data, protocol)
 
     return nonces
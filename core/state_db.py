@@ -0,0 +1,215 @@
+# core/state_db.py
+import weakref
+from collections import deque
+
+from config.settings import STATE_UNDO_DEPTH
+from core.state import apply_block_balances, apply_block_nonces, apply_block_pools, empty_state
+from core.tx_engine import TransactionEngine
+from core.utils import get_protocol
+
+_MISSING = object()
+
+
+class StateView(dict):
+    """
+    Copy-on-write view over a balances dict.
+    Reads fall through to the base, writes stay in the view,
+    so validating or building a block never touches the tip state.
+    Supports the access pattern of TransactionEngine (get / [] / in).
+    """
+
+    __hash__ = object.__hash__  # identity, so live views can be tracked
+
+    def __init__(self, base: dict):
+        super().__init__()
+        self.base = base
+
+    def __missing__(self, key):
+        return self.base[key]
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        if super().__contains__(key):
+            return super().__getitem__(key) is not _MISSING
+        return key in self.base
+
+    def get(self, key, default=None):
+        if super().__contains__(key):
+            value = super().__getitem__(key)
+            return default if value is _MISSING else value
+        return self.base.get(key, default)
+
+    def preserve(self, key, value):
+        """Pins the pre-update base value of key, unless already written"""
+        if not super().__contains__(key):
+            super().__setitem__(key, value)
+
+
+class StateDB:
+    """
+    Balances, nonces and pool reserves at the chain tip.
+    Each block is applied once, when it is appended, instead of
+    replaying the chain for every validation or block template.
+
+    Every applied block leaves an undo entry with the previous value of
+    each key it changed, so the last `undo_depth` blocks can be reverted
+    in O(changed keys). Older entries fall off the journal: those blocks
+    are considered final.
+    """
+
+    def __init__(self, undo_depth=STATE_UNDO_DEPTH):
+        self.tx_engine = TransactionEngine()
+        self.views = weakref.WeakSet()
+        self.undo_depth = undo_depth
+        self.reset()
+
+    def reset(self):
+        self.balances = {}
+        self.nonces = {}
+        self.pools = {}
+        self.index = -1
+        self.hash = None
+        self.journal = deque(maxlen=self.undo_depth)
+
+    def load(self, state: dict, index: int, block_hash: str):
+        """Seeds the tip state (e.g. from a snapshot restore)"""
+        self.balances = state["balances"]
+        self.nonces = state["nonces"]
+        self.pools = state["pools"]
+        self.index = index
+        self.hash = block_hash
+        self.journal = deque(maxlen=self.undo_depth)
+
+    def state(self) -> dict:
+        return {"balances": self.balances, "nonces": self.nonces, "pools": self.pools}
+
+    def apply_block(self, block, protocol):
+        if block.index != self.index + 1 or (self.hash and block.prev_hash != self.hash):
+            raise ValueError(f"Block #{block.index} does not extend state tip #{self.index}")
+
+        overlay = StateView(self.balances)
+        apply_block_balances(overlay, block, protocol, self.tx_engine)
+        changes = dict(overlay)
+
+        nonce_changes = {
+            sender: self.nonces.get(sender, 0) + count
+            for sender, count in apply_block_nonces({}, block, protocol).items()
+        }
+
+        pool_ids = {
+            tx["pool_id"] for tx in block.transactions
+            if tx.get("action") == "add_liquidity"
+        }
+        pool_changes = {pid: dict(self.pools[pid]) for pid in pool_ids if pid in self.pools}
+        apply_block_pools(pool_changes, block)
+
+        self.journal.append({
+            "index": block.index,
+            "hash": block.hash,
+            "prev_hash": self.hash,
+            "balances": {key: self.balances.get(key, _MISSING) for key in changes},
+            "nonces": {key: self.nonces.get(key, _MISSING) for key in nonce_changes},
+            "pools": {key: self.pools.get(key, _MISSING) for key in pool_changes},
+        })
+
+        self.write_balances(changes)
+        self.nonces.update(nonce_changes)
+        self.pools.update(pool_changes)
+
+        self.index = block.index
+        self.hash = block.hash
+
+    def write_balances(self, changes: dict):
+        # Views handed out earlier keep seeing the state they were taken at
+        for view in list(self.views):
+            for key in changes:
+                view.preserve(key, self.balances.get(key, _MISSING))
+
+        for key, value in changes.items():
+            if value is _MISSING:
+                self.balances.pop(key, None)
+            else:
+                self.balances[key] = value
+
+    def revert(self):
+        """Undoes the tip block using its journal entry"""
+        if not self.journal:
+            raise ValueError(f"No undo journal left for block #{self.index}")
+
+        entry = self.journal.pop()
+
+        self.write_balances(entry["balances"])
+
+        for target, changes in ((self.nonces, entry["nonces"]), (self.pools, entry["pools"])):
+            for key, value in changes.items():
+                if value is _MISSING:
+                    target.pop(key, None)
+                else:
+                    target[key] = value
+
+        self.index = entry["index"] - 1
+        self.hash = entry["prev_hash"]
+
+    def reverts_to(self, index) -> bool:
+        """True if the undo journal reaches back to the state after block index"""
+        return index >= self.index - len(self.journal)
+
+    def sync(self, chain):
+        """
+        Brings the state in line with chain[-1], applying only the blocks
+        appended since the last call. Replaced blocks are reverted through
+        the undo journal; a fork deeper than the journal forces a rebuild
+        from genesis.
+        """
+        if not chain:
+            self.reset()
+            return
+
+        if self.hash == chain[-1].hash:
+            return
+
+        protocol = get_protocol(chain)
+
+        while self.index >= 0 and not (self.index < len(chain) and chain[self.index].hash == self.hash):
+            if not self.journal:
+                print(f"State diverged from chain at #{self.index}, rebuilding")
+                self.load(empty_state(), -1, None)
+                break
+
+            self.revert()
+
+        for block in chain[self.index + 1:]:
+            self.apply_block(block, protocol)
+
+    def at(self, block):
+        """
+        Balances view after `block`: the tip, or an ancestor still covered
+        by the undo journal. None if the state cannot reach it.
+        """
+        if block is None:
+            return None
+
+        if self.hash == block.hash:
+            return self.view()
+
+        entries = list(self.journal)
+        for pos, entry in enumerate(entries):
+            if entry["prev_hash"] == block.hash and entry["index"] == block.index + 1:
+                view = self.view()
+                # Oldest reverted entry first: it holds the value after `block`
+                for later in entries[pos:]:
+                    for key, value in later["balances"].items():
+                        view.preserve(key, value)
+                return view
+
+        return None
+
+    def view(self):
+        view = StateView(self.balances)
+        self.views.add(view)
+        return view
@@ -1,20 +1,386 @@
 # core/storage.py
+import copy
+import os
+import shutil
+import struct
+import threading
 from pathlib import Path
 from core.crypto import CryptoStore
 
-CHAIN_FILE = Path("/data/chain.enc")
+DATA_DIR = Path("/data")
+CHAIN_FILE = DATA_DIR / "chain.enc"  # legacy whole-chain file (migrated on startup)
+BLOCKS_DIR = DATA_DIR / "blocks"
+
+MANIFEST_NAME = "manifest.enc"
+INDEX_NAME = "index.dat"
+SEGMENT_BLOCKS = 10_000  # blocks per segment file
+RECORD_HEADER = struct.Struct(">I")
+
+# height -> (segment number, record offset, record length, block hash)
+INDEX_ENTRY = struct.Struct(">IQI32s")
+
+
+def write_atomic(path: Path, data: bytes):
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class SegmentLog:
+    """
+    Append-only log of individually encrypted block records.
+
+    Each record is a 4-byte length followed by a Fernet token and lives in
+    a segment file holding at most SEGMENT_BLOCKS records. The manifest is
+    the commit point: bytes written past a segment's committed size are
+    ignored by readers and overwritten by the next append.
+
+    index.dat holds one fixed-size entry per height, so any block can be
+    located with a single seek. Block hashes are public data and are kept
+    in clear there; the hash -> height map is rebuilt from it in memory.
+    """
+
+    def __init__(self, root: Path, crypto: CryptoStore):
+        self.root = Path(root)
+        self.crypto = crypto
+        self.manifest = self.read_manifest()
+
+        self.hash_index = {}
+        self.indexed = 0
+        self.indexed_generation = None
+
+    @property
+    def manifest_file(self) -> Path:
+        return self.root / MANIFEST_NAME
+
+    @property
+    def index_file(self) -> Path:
+        return self.root / INDEX_NAME
+
+    @property
+    def height(self) -> int:
+        return self.manifest["height"]
+
+    # --------------------------------------------------
+    # MANIFEST
+    # --------------------------------------------------
+
+    def read_manifest(self) -> dict:
+        if not self.manifest_file.exists():
+            return {
+                "segment_blocks": SEGMENT_BLOCKS,
+                "height": 0,
+                "tip_hash": None,
+                "generation": 0,
+                "segments": [],
+            }
+        return self.crypto.decrypt(self.manifest_file.read_bytes())
+
+    def write_manifest(self, manifest: dict):
+        self.root.mkdir(parents=True, exist_ok=True)
+        write_atomic(self.manifest_file, self.crypto.encrypt(manifest))
+        self.manifest = manifest
+
+    def refresh(self):
+        self.manifest = self.read_manifest()
+
+    # --------------------------------------------------
+    # RECORDS
+    # --------------------------------------------------
+
+    def encode_record(self, record: dict) -> bytes:
+        token = self.crypto.encrypt(record)
+        return RECORD_HEADER.pack(len(token)) + token
+
+    def iter_segment(self, segment: dict):
+        """Yields (offset, token) for every committed record of a segment"""
+        with open(self.root / segment["name"], "rb") as f:
+            data = f.read(segment["size"])
+
+        pos = 0
+        while pos < len(data):
+            (length,) = RECORD_HEADER.unpack_from(data, pos)
+            start = pos + RECORD_HEADER.size
+            yield pos, data[start:start + length]
+            pos = start + length
+
+    # --------------------------------------------------
+    # INDEX
+    # --------------------------------------------------
+
+    def read_entries(self, start: int, end: int) -> list:
+        """Returns the raw index entries for heights [start, end)"""
+        with open(self.index_file, "rb") as f:
+            f.seek(start * INDEX_ENTRY.size)
+            data = f.read((end - start) * INDEX_ENTRY.size)
+        return list(INDEX_ENTRY.iter_unpack(data))
+
+    def sync_hash_index(self):
+        """
+        Brings the in-memory hash -> height map up to the committed height.
+        Only new entries are read unless the log was truncated meanwhile.
+        """
+        generation = self.manifest.get("generation", 0)
+        if generation != self.indexed_generation or self.indexed > self.height:
+            self.hash_index = {}
+            self.indexed = 0
+            self.indexed_generation = generation
+
+        if self.indexed == self.height:
+            return
+
+        for height, entry in enumerate(
+            self.read_entries(self.indexed, self.height), start=self.indexed
+        ):
+            self.hash_index[entry[3].hex()] = height
+
+        self.indexed = self.height
+
+    def height_of(self, block_hash: str):
+        self.sync_hash_index()
+        return self.hash_index.get(block_hash)
+
+    def read_range(self, start: int, end: int) -> list:
+        """Decrypts only the records for heights [start, end)"""
+        start = max(start, 0)
+        end = min(end, self.height)
+        if start >= end:
+            return []
+
+        records = []
+        handles = {}
+        try:
+            for segment_no, offset, length, _ in self.read_entries(start, end):
+                f = handles.get(segment_no)
+                if f is None:
+                    name = self.manifest["segments"][segment_no]["name"]
+                    f = handles[segment_no] = open(self.root / name, "rb")
+
+                f.seek(offset + RECORD_HEADER.size)
+                records.append(self.crypto.decrypt(f.read(length)))
+        finally:
+            for f in handles.values():
+                f.close()
+
+        return records
+
+    def read(self, index: int) -> dict:
+        if index < 0 or index >= self.height:
+            raise IndexError(f"Block {index} out of range")
+        return self.read_range(index, index + 1)[0]
+
+    def read_all(self) -> list:
+        records = []
+        for segment in self.manifest["segments"]:
+            for _, token in self.iter_segment(segment):
+                records.append(self.crypto.decrypt(token))
+        return records
+
+    # --------------------------------------------------
+    # WRITES
+    # --------------------------------------------------
+
+    def append(self, records: list):
+        if not records:
+            return
+
+        self.root.mkdir(parents=True, exist_ok=True)
+
+        manifest = copy.deepcopy(self.manifest)
+        segments = manifest["segments"]
+        per_segment = manifest["segment_blocks"]
+        pending = list(records)
+        entries = []
+
+        while pending:
+            if not segments or segments[-1]["count"] >= per_segment:
+                segments.append({
+                    "name": f"segment_{len(segments):06d}.log",
+                    "count": 0,
+                    "size": 0,
+                })
+
+            segment = segments[-1]
+            room = per_segment - segment["count"]
+            batch, pending = pending[:room], pending[room:]
+            encoded = [self.encode_record(r) for r in batch]
+            data = b"".join(encoded)
+
+            offset = segment["size"]
+            for record, raw in zip(batch, encoded):
+                entries.append(INDEX_ENTRY.pack(
+                    len(segments) - 1,
+                    offset,
+                    len(raw) - RECORD_HEADER.size,
+                    bytes.fromhex(record["hash"]),
+                ))
+                offset += len(raw)
+
+            path = self.root / segment["name"]
+            with open(path, "r+b" if path.exists() else "wb") as f:
+                # Drop anything left behind by an uncommitted write
+                f.truncate(segment["size"])
+                f.seek(segment["size"])
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+
+            segment["count"] += len(batch)
+            segment["size"] += len(data)
+
+        with open(self.index_file, "r+b" if self.index_file.exists() else "wb") as f:
+            f.truncate(manifest["height"] * INDEX_ENTRY.size)
+            f.seek(manifest["height"] * INDEX_ENTRY.size)
+            f.write(b"".join(entries))
+            f.flush()
+            os.fsync(f.fileno())
+
+        manifest["height"] += len(records)
+        manifest["tip_hash"] = records[-1]["hash"]
+        self.write_manifest(manifest)
+
+    def rebuild_index(self):
+        """Regenerates index.dat from the segments (logs written without one)"""
+        entries = []
+        for segment_no, segment in enumerate(self.manifest["segments"]):
+            for offset, token in self.iter_segment(segment):
+                entries.append(INDEX_ENTRY.pack(
+                    segment_no,
+                    offset,
+                    len(token),
+                    bytes.fromhex(self.crypto.decrypt(token)["hash"]),
+                ))
+
+        self.root.mkdir(parents=True, exist_ok=True)
+        write_atomic(self.index_file, b"".join(entries))
+
+    def truncate(self, height: int):
+        """Drops every record at index >= height"""
+        if height >= self.height:
+            return
+
+        tip_hash = self.read_entries(height - 1, height)[0][3].hex() if height > 0 else None
+        segment_no, offset, _, _ = self.read_entries(height, height + 1)[0]
+
+        manifest = copy.deepcopy(self.manifest)
+        segments = manifest["segments"][:segment_no]
+        if offset:
+            segment = manifest["segments"][segment_no]
+            segment["count"] = height - segment_no * manifest["segment_blocks"]
+            segment["size"] = offset
+            segments.append(segment)
+
+        dropped = manifest["segments"][len(segments):]
+
+        manifest["segments"] = segments
+        manifest["height"] = height
+        manifest["tip_hash"] = tip_hash
+        manifest["generation"] = manifest.get("generation", 0) + 1
+        self.write_manifest(manifest)
+
+        for segment in dropped:
+            (self.root / segment["name"]).unlink(missing_ok=True)
+
+
+def migrate_legacy_chain(crypto: CryptoStore):
+    """One-shot conversion of the old whole-chain chain.enc into a block log"""
+    blocks = crypto.decrypt(CHAIN_FILE.read_bytes())
+
+    tmp = BLOCKS_DIR.with_name(f"{BLOCKS_DIR.name}.migrating-{os.getpid()}")
+    shutil.rmtree(tmp, ignore_errors=True)
+
+    log = SegmentLog(tmp, crypto)
+    log.write_manifest(log.manifest)
+    log.append(blocks)
+
+    try:
+        os.rename(tmp, BLOCKS_DIR)
+    except OSError:
+        # Another process (node/API) completed the migration first
+        shutil.rmtree(tmp, ignore_errors=True)
+        return
+
+    CHAIN_FILE.rename(CHAIN_FILE.with_name(CHAIN_FILE.name + ".migrated"))
+    print(f"Migrated {len(blocks)} blocks from {CHAIN_FILE} to {BLOCKS_DIR}")
+
 
 class ChainStorage:
     def __init__(self):
         self.crypto = CryptoStore()
+        self.lock = threading.Lock()
+
+        if not (BLOCKS_DIR / MANIFEST_NAME).exists() and CHAIN_FILE.exists():
+            migrate_legacy_chain(self.crypto)
+
+        self.log = SegmentLog(BLOCKS_DIR, self.crypto)
+
+        index_size = self.log.index_file.stat().st_size if self.log.index_file.exists() else 0
+        if index_size < self.log.height * INDEX_ENTRY.size:
+            self.log.rebuild_index()
 
     def save(self, chain):
-        payload = [block.to_dict() for block in chain]
-        encrypted = self.crypto.encrypt(payload)
-        CHAIN_FILE.write_bytes(encrypted)
+        """
+        Persists the chain, writing only the blocks that are not stored yet.
+        A replaced tip (fork tie-break) truncates the log back to the
+        last block both sides agree on before appending.
+        """
+        with self.lock:
+            chain = list(chain)
+            stored = self.log.height
+            common = min(stored, len(chain))
+
+            if common and not (
+                common == stored
+                and self.log.manifest["tip_hash"] == chain[common - 1].hash
+            ):
+                while common > 0 and self.log.read_entries(common - 1, common)[0][3].hex() != chain[common - 1].hash:
+                    common -= 1
+
+            self.log.truncate(common)
+            self.log.append([block.to_dict() for block in chain[common:]])
 
     def load(self):
-        if not CHAIN_FILE.exists():
-            return []
-        encrypted = CHAIN_FILE.read_bytes()
-        return self.crypto.decrypt(encrypted)
+        with self.lock:
+            self.log.refresh()
+            return self.log.read_all()
+
+    # --------------------------------------------------
+    # RANDOM ACCESS (cost independent of chain length)
+    # --------------------------------------------------
+
+    def height(self) -> int:
+        with self.lock:
+            self.log.refresh()
+            return self.log.height
+
+    def hash_at(self, index: int):
+        """Block hash at the given height, read from the index only"""
+        with self.lock:
+            self.log.refresh()
+            if index < 0 or index >= self.log.height:
+                return None
+            return self.log.read_entries(index, index + 1)[0][3].hex()
+
+    def get_block(self, index: int):
+        with self.lock:
+            self.log.refresh()
+            if index < 0 or index >= self.log.height:
+                return None
+            return self.log.read(index)
+
+    def get_range(self, start: int, end: int) -> list:
+        """Blocks with start <= index < end"""
+        with self.lock:
+            self.log.refresh()
+            return self.log.read_range(start, end)
+
+    def get_by_hash(self, block_hash: str):
+        with self.lock:
+            self.log.refresh()
+            index = self.log.height_of(block_hash)
+            if index is None:
+                return None
+            return self.log.read(index)
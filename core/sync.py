@@ -0,0 +1,665 @@
+# core/sync.py
+
+import asyncio
+import time
+
+from core.block import BlockHeader
+from core.compact_block import LEADER_FIELDS
+
+LOCATOR_DENSE = 10  # most recent blocks listed one by one in a locator
+LOCATOR_MAX = 64  # entries read from a peer's locator
+SYNC_HEADERS_PAGE = 2000  # headers per get_headers request
+SYNC_CHUNK_SIZE = 200  # blocks per range request, answered with a single page
+SYNC_PEER_IN_FLIGHT = 2  # outstanding chunks per peer
+SYNC_CHUNK_TIMEOUT = 10  # seconds before a chunk is requested from another peer
+SYNC_MAX_STRIKES = 3  # timeouts / bad chunks before a peer gets no more requests
+SYNC_REPORT_INTERVAL = 5  # seconds between progress lines
+LEGACY_PAGE_SIZE = 200  # blocks per page of a version 1 peer (BLOCKS_PER_PAGE)
+
+
+def block_locator(chain) -> list:
+    """
+    [[index, hash]] from the tip down to genesis: the last LOCATOR_DENSE
+    blocks one by one, then with doubling gaps, so a peer finds the
+    common ancestor in one round trip at O(log n) message size.
+    """
+    locator = []
+    index, step = len(chain) - 1, 1
+
+    while index > 0:
+        locator.append([index, chain[index].hash])
+        if len(locator) >= LOCATOR_DENSE:
+            step *= 2
+        index -= step
+
+    if chain:
+        locator.append([0, chain[0].hash])
+    return locator
+
+
+def find_ancestor(chain, locator) -> int:
+    """Index of the highest locator entry that is on chain, -1 if none"""
+    for entry in locator[:LOCATOR_MAX]:
+        try:
+            index, block_hash = entry
+        except (TypeError, ValueError):
+            continue
+
+        if isinstance(index, int) and 0 <= index < len(chain) and chain[index].hash == block_hash:
+            return index
+    return -1
+
+
+class RangeSync:
+    """
+    Headers-first catch-up from several peers at once.
+
+    Headers are fetched first, a page at a time from the highest peer,
+    and checked for linkage, leader schedule and producer signature
+    before any body is requested. Every verified header page is split
+    into body chunks of SYNC_CHUNK_SIZE, requested ("get_blocks" with
+    "to") from every peer whose reported tip covers them,
+    SYNC_PEER_IN_FLIGHT at a time per peer. A chunk is only kept if its
+    blocks hash to the verified headers; chunks are then applied
+    strictly in height order through the normal sync validation.
+    Requests that time out or fail go to another peer, and a peer that
+    keeps failing is skipped for the rest of the sync.
+
+    The first header request carries a block locator, so the peer
+    answers from the last block both chains share. If its branch forks
+    below the local tip, the local blocks above the ancestor are rolled
+    back once the first body of the other branch is ready, and restored
+    if that branch cannot be applied past the old tip. Only forks the
+    state undo journal covers (STATE_UNDO_DEPTH blocks) are followed;
+    a deeper one would rebuild the state from genesis on the loop.
+
+    Version 1 peers serve neither headers nor ranges. When no other peer
+    can extend the headers, one of them is asked for every block above
+    the local tip ("get_blocks" without "to"), which it streams in pages
+    without "from"; those are applied in full validation as they come.
+    """
+
+    def __init__(self, network):
+        self.network = network
+        self.target = None
+        self.heights = {}  # peer_id -> latest index it reported
+        self.tip_hashes = {}  # peer_id -> hash of that block, if reported
+        self.headers = {}  # index -> verified BlockHeader above the local tip
+        self.header_peers = {}  # index -> peer whose header page it came from
+        self.header_tip = -1
+        self.header_request = None  # (peer_id, from, requested_at)
+        self.header_failed = set()  # peers whose headers were refused
+        self.located = False  # common ancestor known (first header page received)
+        self.fork_point = None  # first height where the verified headers leave the local chain
+        self.orphaned = []  # local blocks rolled back for the other branch
+        self.queue = []  # (start, end) chunks waiting for a peer
+        self.in_flight = {}  # (start, end) -> (peer_id, requested_at)
+        self.ready = {}  # start -> (peer_id, end, blocks), linkage checked
+        self.failed = {}  # (start, end) -> peer ids that failed it
+        self.strikes = {}
+        self.legacy = None  # (peer_id, last_page_at, last_index) of a version 1 peer streaming blocks
+        self.legacy_pages = []  # (peer_id, blocks, error) in arrival order
+        self.wakeup = asyncio.Event()
+        self.task = None
+
+        self.applied = 0
+        self.started_at = None
+
+    @property
+    def active(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    def note_height(self, peer_id, index, tip_hash=None):
+        """Records a peer's tip; a running sync extends its target to it"""
+        if index >= self.heights.get(peer_id, -1):
+            self.heights[peer_id] = index
+            self.tip_hashes[peer_id] = tip_hash
+
+        if self.active and index > self.target:
+            self.target = index
+            self.network.sync_target = index
+            self.wakeup.set()
+
+    @staticmethod
+    def chunks(start, end):
+        return [
+            (first, min(first + SYNC_CHUNK_SIZE - 1, end))
+            for first in range(start, end + 1, SYNC_CHUNK_SIZE)
+        ]
+
+    def start(self, target):
+        if self.active:
+            return
+
+        self.target = target
+        self.headers = {}
+        self.header_peers = {}
+        self.header_tip = len(self.network.chain) - 1
+        self.header_request = None
+        self.header_failed = set()
+        self.located = False
+        self.fork_point = None
+        self.orphaned = []
+        self.queue = []
+        self.in_flight = {}
+        self.ready = {}
+        self.failed = {}
+        self.strikes = {}
+        self.legacy = None
+        self.legacy_pages = []
+        self.applied = 0
+        self.started_at = time.time()
+
+        self.task = asyncio.create_task(self.run())
+
+    # --------------------
+    # HEADERS
+    # --------------------
+
+    def usable(self, peer_id) -> bool:
+        return peer_id in self.network.peers and self.strikes.get(peer_id, 0) < SYNC_MAX_STRIKES
+
+    def ranged(self, peer_id) -> bool:
+        """Serves get_headers and ranged get_blocks (protocol version 2)"""
+        peer = self.network.peers.get(peer_id)
+        return peer is not None and peer.version >= 2
+
+    def branch_height(self, peer_id) -> int:
+        """Up to where a peer can serve bodies of the verified branch (as far as known)"""
+        height = self.heights.get(peer_id, -1)
+        header = self.headers.get(height)
+
+        if header is not None and self.tip_hashes.get(peer_id) not in (None, header.hash):
+            return -1  # its tip is on another branch
+        return height
+
+    async def request_headers(self) -> bool:
+        """Keeps one header request outstanding; False once no peer can extend the headers"""
+        if self.header_request is not None or self.header_tip >= self.target:
+            return True
+
+        candidates = [
+            peer_id for peer_id, height in self.heights.items()
+            if height > self.header_tip
+            and self.usable(peer_id)
+            and self.ranged(peer_id)
+            and peer_id not in self.header_failed
+        ]
+        if not candidates:
+            return False
+
+        peer_id = max(candidates, key=lambda candidate: self.heights[candidate])
+        start = self.header_tip + 1
+        msg = {"type": "get_headers", "from": start, "count": SYNC_HEADERS_PAGE}
+
+        if not self.located:
+            # the peer answers from the common ancestor instead
+            msg["locator"] = block_locator(self.network.chain)
+            start = None
+
+        self.header_request = (peer_id, start, time.time())
+        await self.network.send_to(peer_id, msg)
+        return True
+
+    def reject_headers(self, peer_id, reason, diverged_at=None):
+        print(f"Sync headers from {peer_id} {reason}, asking another peer")
+        self.strikes[peer_id] = self.strikes.get(peer_id, 0) + 1
+        self.header_failed.add(peer_id)
+
+        if diverged_at is not None:
+            # its chain only follows ours below that: no bodies above it
+            self.heights[peer_id] = min(self.heights.get(peer_id, -1), diverged_at - 1)
+            self.tip_hashes[peer_id] = None
+
+    def header_before(self, index):
+        """The verified header or local block at index - 1 (None below genesis)"""
+        if index == 0:
+            return None
+        if index - 1 in self.headers:
+            return self.headers[index - 1]
+        if index - 1 < len(self.network.chain):
+            return self.network.chain[index - 1]
+        return None
+
+    async def on_headers(self, peer_id, msg):
+        if self.header_request is None:
+            return
+
+        owner, start, _ = self.header_request
+        if owner != peer_id or (start is not None and msg.get("from") != start):
+            return
+
+        if start is None:
+            start = msg.get("from")
+            if not isinstance(start, int) or not 0 <= start <= len(self.network.chain):
+                self.reject_headers(peer_id, f"started at an unknown ancestor {start}")
+                self.header_request = None
+                self.wakeup.set()
+                return
+            self.header_tip = start - 1
+
+        # stays outstanding until verified, so it is not sent again meanwhile
+        try:
+            await self.verify_headers(peer_id, start, msg["data"])
+        finally:
+            self.header_request = None
+            self.wakeup.set()
+
+    async def verify_headers(self, peer_id, start, received):
+        try:
+            headers = [BlockHeader.from_dict(raw) for raw in received[:SYNC_HEADERS_PAGE]]
+        except Exception:
+            self.reject_headers(peer_id, "were malformed")
+            return
+
+        if not headers:
+            self.reject_headers(peer_id, f"ended below its reported tip {self.heights.get(peer_id)}")
+            return
+
+        validator = self.network.validator
+        state_db = validator.state_db
+        chain = self.network.chain
+        # apply_synced_blocks may be using the shared cache meanwhile
+        preverified = await validator.preverify(headers, mode="sync")
+
+        try:
+            verified = 0
+            first_new = None
+            too_deep = False
+            for header in headers:
+                if header.index != self.header_tip + 1:
+                    break
+
+                if self.fork_point is None and header.index < len(chain):
+                    if chain[header.index].hash == header.hash:
+                        # still shared with the local chain
+                        self.header_tip = header.index
+                        verified += 1
+                        continue
+                    if header.index == 0:
+                        break  # another genesis
+                    if state_db is not None and not state_db.reverts_to(header.index - 1):
+                        # the state would be rebuilt from genesis on the loop
+                        too_deep = True
+                        break
+                    self.fork_point = header.index
+                    print(f"Peer {peer_id} is on another branch from #{header.index}")
+
+                if not validator.check_header(header, self.header_before(header.index)):
+                    break
+
+                self.headers[header.index] = header
+                self.header_peers[header.index] = peer_id
+                self.header_tip = header.index
+                first_new = header.index if first_new is None else first_new
+                verified += 1
+        finally:
+            validator.verifier.discard(preverified)
+
+        self.located = True
+
+        if first_new is not None:
+            self.queue.extend(self.chunks(first_new, self.header_tip))
+            self.heights[peer_id] = max(self.heights.get(peer_id, -1), self.header_tip)
+
+        if verified < len(headers):
+            self.reject_headers(
+                peer_id,
+                f"fork at #{start + verified} deeper than the state undo journal, not switching"
+                if too_deep else f"failed verification at #{start + verified}",
+                diverged_at=start + verified
+            )
+
+    # --------------------
+    # BODIES
+    # --------------------
+
+    def legacy_candidates(self, above) -> list:
+        return [
+            peer_id for peer_id, height in self.heights.items()
+            if height > above and self.usable(peer_id) and not self.ranged(peer_id)
+        ]
+
+    async def request_legacy(self) -> bool:
+        """Keeps one version 1 stream going; False once no such peer is above the local tip"""
+        if self.legacy is not None:
+            return True
+
+        tip = len(self.network.chain) - 1
+        candidates = self.legacy_candidates(tip)
+        if not candidates:
+            return False
+
+        peer_id = max(candidates, key=lambda candidate: self.heights[candidate])
+        self.legacy = (peer_id, time.time(), tip)
+        await self.network.send_to(peer_id, {"type": "get_blocks", "from": tip + 1})
+        return True
+
+    def end_legacy(self, peer_id, reason=None):
+        """Ends a version 1 stream; its peer is not asked again for more than it sent"""
+        last_index = self.legacy[2] if self.legacy and self.legacy[0] == peer_id else len(self.network.chain) - 1
+        self.legacy = None
+        self.heights[peer_id] = min(self.heights.get(peer_id, -1), last_index)
+
+        if reason:
+            print(f"Sync stream from {peer_id} {reason}")
+            self.strikes[peer_id] = self.strikes.get(peer_id, 0) + 1
+
+    def pick_peer(self, chunk):
+        load = {}
+        for peer_id, _ in self.in_flight.values():
+            load[peer_id] = load.get(peer_id, 0) + 1
+
+        candidates = [
+            peer_id for peer_id in self.heights
+            if self.branch_height(peer_id) >= chunk[1]
+            and self.usable(peer_id)
+            and self.ranged(peer_id)
+            and peer_id not in self.failed.get(chunk, ())
+            and load.get(peer_id, 0) < SYNC_PEER_IN_FLIGHT
+        ]
+        return min(candidates, key=lambda peer_id: load.get(peer_id, 0), default=None)
+
+    def servable(self, chunk) -> bool:
+        """Whether any usable peer is left for chunk, busy or not"""
+        return any(
+            self.branch_height(peer_id) >= chunk[1]
+            and self.usable(peer_id)
+            and self.ranged(peer_id)
+            and peer_id not in self.failed.get(chunk, ())
+            for peer_id in self.heights
+        )
+
+    async def assign(self):
+        # lowest heights first: application never waits on a later chunk
+        self.queue.sort()
+        waiting = []
+
+        for chunk in self.queue:
+            peer_id = self.pick_peer(chunk)
+            if peer_id is None:
+                waiting.append(chunk)
+                continue
+
+            self.in_flight[chunk] = (peer_id, time.time())
+            await self.network.send_to(peer_id, {
+                "type": "get_blocks",
+                "from": chunk[0],
+                "to": chunk[1]
+            })
+
+        self.queue = waiting
+
+    def retry(self, chunk, peer_id, reason):
+        print(f"Sync chunk {chunk[0]}-{chunk[1]} from {peer_id} {reason}, re-requesting")
+        self.strikes[peer_id] = self.strikes.get(peer_id, 0) + 1
+        self.failed.setdefault(chunk, set()).add(peer_id)
+        self.queue.append(chunk)
+
+    def expire(self):
+        now = time.time()
+
+        if self.header_request is not None:
+            peer_id, _, requested_at = self.header_request
+            if peer_id not in self.network.peers:
+                self.header_request = None
+            elif now - requested_at > SYNC_CHUNK_TIMEOUT:
+                self.header_request = None
+                self.reject_headers(peer_id, "timed out")
+
+        if self.legacy is not None:
+            peer_id, last_page_at, _ = self.legacy
+            if peer_id not in self.network.peers:
+                self.legacy = None
+            elif now - last_page_at > SYNC_CHUNK_TIMEOUT:
+                self.end_legacy(peer_id, "timed out")
+
+        for chunk, (peer_id, requested_at) in list(self.in_flight.items()):
+            if peer_id not in self.network.peers:
+                del self.in_flight[chunk]
+                self.queue.append(chunk)
+            elif now - requested_at > SYNC_CHUNK_TIMEOUT:
+                del self.in_flight[chunk]
+                self.retry(chunk, peer_id, "timed out")
+
+    # --------------------
+    # RESPONSES
+    # --------------------
+
+    def on_chunk(self, peer_id, msg) -> bool:
+        """
+        Takes a "blocks" page answering one of our range requests, or
+        one of the stream of a version 1 peer; False if it is neither.
+        """
+        if "from" not in msg:
+            return self.on_legacy_page(peer_id, msg)
+
+        start = msg.get("from")
+        chunk = next(
+            (c for c, (owner, _) in self.in_flight.items() if c[0] == start and owner == peer_id),
+            None
+        )
+        if chunk is None:
+            return False
+
+        del self.in_flight[chunk]
+        blocks = msg["data"]  # already parsed, off the loop for large pages
+
+        if not blocks and not msg["error"]:
+            # its chain no longer reaches that far (e.g. mid branch switch)
+            print(f"Sync chunk {chunk[0]}-{chunk[1]} from {peer_id} was empty, re-requesting")
+            self.heights[peer_id] = min(self.heights.get(peer_id, -1), chunk[0] - 1)
+            self.queue.append(chunk)
+        elif msg["error"]:
+            self.retry(chunk, peer_id, "was malformed")
+        elif not self.matches_headers(blocks, chunk):
+            self.retry(chunk, peer_id, "does not match the verified headers")
+        else:
+            self.ready[chunk[0]] = (peer_id, chunk[1], blocks)
+
+        self.wakeup.set()
+        return True
+
+    def on_legacy_page(self, peer_id, msg) -> bool:
+        if self.legacy is None or self.legacy[0] != peer_id:
+            return False
+
+        blocks = msg["data"]
+        self.legacy_pages.append((peer_id, blocks, msg["error"]))
+        self.legacy = (peer_id, time.time(), blocks[-1].index if blocks else self.legacy[2])
+
+        if msg["error"] or len(blocks) < LEGACY_PAGE_SIZE:
+            self.end_legacy(peer_id)  # last page; a bad one is struck once applied
+
+        self.wakeup.set()
+        return True
+
+    def matches_headers(self, blocks, chunk) -> bool:
+        """Blocks hash to the verified headers, so they are linked as well"""
+        start, end = chunk
+        if len(blocks) != end - start + 1:
+            return False
+
+        for offset, block in enumerate(blocks):
+            header = self.headers.get(start + offset)
+            if block.index != start + offset or header is None or block.hash != header.hash:
+                return False
+
+        return True
+
+    async def apply_ready(self):
+        network = self.network
+
+        if self.fork_point is not None and self.fork_point in self.ready:
+            dropped = network.rollback_to(self.fork_point - 1)
+            if self.orphaned:
+                # switching again: the local branch is still the one to restore
+                first = self.orphaned[0].index
+                dropped = [block for block in dropped if block.index < first] + self.orphaned
+            self.orphaned = dropped
+            self.fork_point = None
+
+        while len(network.chain) in self.ready:
+            start = len(network.chain)
+            peer_id, end, blocks = self.ready.pop(start)
+
+            if network.chain and blocks[0].prev_hash != network.chain[-1].hash:
+                self.retry((start, end), peer_id, "does not extend the local tip")
+                continue
+
+            ok = await network.apply_synced_blocks(blocks)
+
+            self.applied += len(network.chain) - start
+            for index in range(start, len(network.chain)):
+                self.headers.pop(index, None)
+                self.header_peers.pop(index, None)
+
+            if not ok:
+                # the valid prefix stays; the body hashed to its verified
+                # header, so it is the header branch that is invalid
+                self.drop_branch(len(network.chain))
+
+    async def apply_legacy(self):
+        network = self.network
+
+        while self.legacy_pages:
+            peer_id, blocks, error = self.legacy_pages.pop(0)
+            start = len(network.chain)
+            ok = await network.apply_synced_blocks(blocks)
+            self.applied += len(network.chain) - start
+
+            if not ok or error:
+                # the rest of its stream cannot extend the tip either
+                self.legacy_pages = []
+                self.end_legacy(peer_id, "failed validation" if not ok else "was malformed")
+
+    def drop_branch(self, index):
+        """
+        Forgets the verified headers from index on, with every chunk
+        above, and asks another peer for headers: every peer would serve
+        the same invalid block for them. That peer's branch may leave the
+        applied one lower down, so the ancestor is located again.
+        """
+        peer_id = self.header_peers.get(index)
+
+        self.headers = {i: header for i, header in self.headers.items() if i < index}
+        self.header_peers = {i: peer for i, peer in self.header_peers.items() if i < index}
+        self.header_tip = index - 1
+        self.header_request = None
+        self.located = False
+        self.fork_point = None
+
+        self.queue = [chunk for chunk in self.queue if chunk[1] < index]
+        self.in_flight = {chunk: v for chunk, v in self.in_flight.items() if chunk[1] < index}
+        self.ready = {start: v for start, v in self.ready.items() if v[1] < index}
+
+        if peer_id is not None:
+            self.reject_headers(peer_id, f"lead to invalid block #{index}", diverged_at=index)
+
+    def settle_branch(self):
+        """
+        After a branch switch: puts back the local branch if the new one
+        ended up shorter, otherwise returns its orphaned user txs to the
+        mempool.
+        """
+        network = self.network
+        orphaned, self.orphaned = self.orphaned, []
+        if not orphaned:
+            return
+
+        ancestor = orphaned[0].index - 1
+
+        if len(network.chain) - 1 < orphaned[-1].index:
+            print(f"Branch switch failed, restoring local blocks #{orphaned[0].index}-{orphaned[-1].index}")
+            network.rollback_to(ancestor)
+            network.chain.extend(orphaned)
+            for block in orphaned:
+                network.register_block(block)
+            return
+
+        included = {tx["txid"] for block in network.chain[ancestor + 1:] for tx in block.transactions}
+        restored = 0
+
+        for block in orphaned:
+            for tx in block.transactions:
+                if tx["txid"] in included or not isinstance(tx.get("_meta"), dict):
+                    continue  # system txs only belong to their own block
+                tx = {key: value for key, value in tx.items() if key not in LEADER_FIELDS}
+                restored += bool(network.mempool.add(tx))
+
+        print(f"Switched branch at #{ancestor + 1}, {restored} orphaned txs back in the mempool")
+
+    # --------------------
+    # DRIVER
+    # --------------------
+
+    def report(self, final=False):
+        elapsed = max(time.time() - self.started_at, 1e-9)
+        tip = len(self.network.chain) - 1
+        label = "Sync finished" if final else "Syncing"
+
+        print(
+            f"{label}: tip {tip}/{self.target}, headers to {self.header_tip}, "
+            f"{self.applied} blocks in {elapsed:.1f}s ({self.applied / elapsed:.1f} blocks/s), "
+            f"{len(self.in_flight)} chunks in flight from "
+            f"{len({peer_id for peer_id, _ in self.in_flight.values()})} peers"
+        )
+
+    async def run(self):
+        last_report = time.time()
+        monitor = self.network.loop_monitor
+        if monitor is not None:
+            monitor.start()
+
+        try:
+            while len(self.network.chain) - 1 < self.target:
+                self.wakeup.clear()
+
+                self.expire()
+                await self.apply_ready()
+                await self.apply_legacy()
+                if len(self.network.chain) - 1 >= self.target:
+                    break
+
+                # a version 1 stream is left to finish before headers resume
+                if self.legacy is None and not self.legacy_pages and not await self.request_headers():
+                    if self.header_tip > len(self.network.chain) - 1:
+                        # bodies first; version 1 peers may take it further after
+                        if not self.legacy_candidates(self.header_tip):
+                            # settle for the best verified branch
+                            self.target = self.header_tip
+                            self.network.sync_target = self.target
+                    elif not await self.request_legacy():
+                        print("Sync aborted: no peer served valid headers")
+                        break
+
+                await self.assign()
+
+                stuck = [chunk for chunk in self.queue if not self.servable(chunk)]
+                if stuck and not self.in_flight:
+                    print(f"Sync aborted: no peer can serve blocks {stuck[0][0]}-{stuck[0][1]}")
+                    break
+
+                if time.time() - last_report >= SYNC_REPORT_INTERVAL:
+                    self.report()
+                    last_report = time.time()
+
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout=1)
+                except asyncio.TimeoutError:
+                    pass
+
+            self.report(final=True)
+
+        except Exception as e:
+            print(f"Sync failed: {e!r}")
+
+        finally:
+            self.settle_branch()
+            self.queue, self.in_flight, self.ready, self.headers = [], {}, {}, {}
+            self.header_peers = {}
+            self.legacy, self.legacy_pages = None, []
+            self.header_request = None
+            if monitor is not None:
+                monitor.stop()
+            self.network.finish_sync()
@@ -15,7 +15,33 @@ def k(addr, asset):
 def is_canonical_amount(x) -> bool:
     return Decimal(str(x)).as_tuple().exponent >= -8
 
+SIGNED_FIELDS = ("txid", "action", "asset", "amount", "to", "nonce", "chainId")
+
+def signed_message(tx: dict) -> str:
+    """Canonical message the wallet signed for a user tx"""
+    signed_payload = {
+        key: tx[key]
+        for key in SIGNED_FIELDS
+        if key in tx
+    }
+    return canonical_tx(signed_payload)
+
+def recover_sender(message: str, signature) -> str:
+    return Account.recover_message(
+        encode_defunct(text=message),
+        signature=signature
+    )
+
 class TransactionEngine:
+    def __init__(self, recovery=None):
+        # Optional SenderRecovery holding senders recovered in a worker pool
+        self.recovery = recovery
+
+    def recover(self, message: str, signature) -> str:
+        if self.recovery is not None:
+            return self.recovery.recover(message, signature)
+        return recover_sender(message, signature)
+
     @staticmethod
     def calculate_fee(amount, protocol) -> dict:
         amount = Decimal(str(amount))
@@ -72,19 +98,9 @@ class TransactionEngine:
             signature = tx["_meta"]["signature"]
             sender = tx["_meta"]["sender"]
 
-            signed_payload = {
-                key: tx[key]
-                for key in ("txid", "action", "asset", "amount", "to", "nonce", "chainId")
-                if key in tx
-            }
-
-
-            message = canonical_tx(signed_payload)
+            message = signed_message(tx)
 
-            recovered = Account.recover_message(
-                encode_defunct(text=message),
-                signature=signature
-            )
+            recovered = self.recover(message, signature)
 
             if recovered.lower() != sender.lower():
                 raise ValueError("Invalid signature")
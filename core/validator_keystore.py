@@ -6,8 +6,7 @@ from nacl.signing import SigningKey
 from nacl.encoding import RawEncoder
 from hashlib import sha256
 
-from nacl.signing import VerifyKey
-from nacl.exceptions import BadSignatureError
+from core.signature_verifier import verify_ed25519
 
 DATA_DIR = Path("data")
 FERNET_KEY_FILE = DATA_DIR / "validator.node.key"
@@ -49,24 +48,30 @@ def write_env_address(address: str):
     with ENV_FILE.open("a") as f:
         f.write(f"\nNODE_ADDRESS={address}\n")
 
-def verify_block_signature(block, validator_pubkeys: dict) -> bool:
+def block_signature_item(block, validator_pubkeys: dict):
+    """(pubkey, message, signature) to verify for a block, or None"""
+    pubkey = validator_pubkeys.get(block.producer_id.lower())
+
+    if not pubkey or not block.signature:
+        return None
+
+    return pubkey, block.hash.encode(), bytes.fromhex(block.signature)
+
+def verify_block_signature(block, validator_pubkeys: dict, verifier=None) -> bool:
     """
     validator_pubkeys: { address -> pubkey_bytes }
+    verifier: optional SignatureVerifier holding precomputed results
     """
-    try:
-        address = block.producer_id.lower()
-        pubkey = validator_pubkeys.get(address)
+    address = block.producer_id.lower()
+    pubkey = validator_pubkeys.get(address)
 
-        if not pubkey:
-            return False
+    if not pubkey:
+        return False
 
-        vk = VerifyKey(pubkey, encoder=RawEncoder)
+    message = block.hash.encode()
+    signature = bytes.fromhex(block.signature)
 
-        vk.verify(
-            block.hash.encode(),
-            bytes.fromhex(block.signature)
-        )
-        return True
+    if verifier is not None:
+        return verifier.verify(pubkey, message, signature)
 
-    except BadSignatureError:
-        return False
+    return verify_ed25519(pubkey, message, signature)
@@ -0,0 +1,342 @@
+# core/wire.py
+"""
+Frames and message encodings of the p2p protocol.
+
+Every frame is a 4-byte big-endian length followed by the payload.
+Version 1 payloads are JSON text, so they always start with "{". From
+version 2 on, a payload starts with a flags byte (high bit set), and
+what the flags allow depends on the features both sides agreed on in
+the handshake:
+
+  FLAG_BINARY      body is the binary encoding below, otherwise JSON
+  FLAG_COMPRESSED  body is zlib-compressed
+
+Peers that do not announce features keep getting version 1 frames,
+and read_message() accepts both forms from anyone.
+"""
+import json
+import re
+import struct
+import zlib
+
+from config.settings import P2P_WIRE_FEATURES
+
+PROTOCOL_VERSION = 2
+FEATURES = tuple(P2P_WIRE_FEATURES)  # offered in the handshake; reading always accepts all
+
+FLAG_MARKER = 0x80  # never set in the first byte of a JSON payload
+FLAG_COMPRESSED = 0x01
+FLAG_BINARY = 0x02
+
+COMPRESS_MIN = 1024  # bytes; smaller bodies are sent as they are
+COMPRESS_LEVEL = 1  # zlib level: most of the gain at a fraction of the CPU
+
+# Block and tx carrying messages; control messages stay JSON
+BINARY_TYPES = {
+    "block", "blocks", "single_block", "cmpct_block", "block_txs",
+    "headers", "tx",
+}
+
+INTERN_MAX = 128  # strings up to this length are sent once per frame, then by reference
+MAX_DEPTH = 64
+
+T_NONE, T_FALSE, T_TRUE, T_INT, T_FLOAT, T_STR, T_HEX, T_HEX0X, T_LIST, T_DICT, T_REF, T_SHAPE = range(12)
+
+HEX = re.compile(r"(?:[0-9a-f]{2}){8,}")
+HEX0X = re.compile(r"0x(?:[0-9a-f]{2}){8,}")
+DOUBLE = struct.Struct(">d")
+
+
+def peer_version(handshake: dict) -> int:
+    """
+    Protocol version of the peer that sent this handshake. Version 1
+    peers know none of get_headers / headers, ranged get_blocks, inv /
+    getdata and compact blocks.
+    """
+    version = handshake.get("version")
+    if not isinstance(version, int) or isinstance(version, bool) or version < 1:
+        return 1
+    return version
+
+
+def negotiate(handshake: dict) -> frozenset:
+    """Features usable with the peer that sent this handshake"""
+    if peer_version(handshake) < 2:
+        return frozenset()
+
+    offered = handshake.get("features")
+    if not isinstance(offered, list):
+        return frozenset()
+
+    return frozenset(FEATURES) & frozenset(offered)
+
+
+# --------------------
+# BINARY ENCODING
+# --------------------
+#
+# Tagged values, msgpack-like, plus what makes blocks small: lowercase
+# hex strings (hashes, signatures, addresses) travel as raw bytes,
+# short strings (addresses, assets) and dict key layouts (every tx has
+# the same keys) are sent once per frame and then as a table index.
+
+def encode_binary(msg: dict) -> bytes:
+    out = bytearray()
+    append = out.append
+    strings = {}
+    shapes = {}
+    hex_match = HEX.fullmatch
+    hex0x_match = HEX0X.fullmatch
+    pack_double = DOUBLE.pack
+
+    def varint(n):
+        while n >= 0x80:
+            append((n & 0x7F) | 0x80)
+            n >>= 7
+        append(n)
+
+    def encode(value, depth):
+        kind = type(value)
+
+        if kind is str:
+            ref = strings.get(value)
+            if ref is not None:
+                append(T_REF)
+                varint(ref)
+                return
+
+            if hex_match(value):
+                raw = bytes.fromhex(value)
+                append(T_HEX)
+            elif hex0x_match(value):
+                raw = bytes.fromhex(value[2:])
+                append(T_HEX0X)
+            else:
+                raw = value.encode()
+                append(T_STR)
+
+            varint(len(raw))
+            out.extend(raw)
+
+            if len(value) <= INTERN_MAX:
+                strings[value] = len(strings)
+
+        elif kind is dict:
+            if depth > MAX_DEPTH:
+                raise ValueError("Message nested too deeply")
+
+            keys = tuple(value)
+            ref = shapes.get(keys)
+
+            if ref is not None:
+                append(T_SHAPE)
+                varint(ref)
+            else:
+                append(T_DICT)
+                varint(len(keys))
+                for key in keys:
+                    if type(key) is not str:
+                        raise TypeError(f"Keys must be str, not {type(key).__name__}")
+                    encode(key, depth + 1)
+                shapes[keys] = len(shapes)
+
+            for item in value.values():
+                encode(item, depth + 1)
+
+        elif kind is int:
+            append(T_INT)
+            varint(value * 2 if value >= 0 else -value * 2 - 1)
+
+        elif kind is float:
+            append(T_FLOAT)
+            out.extend(pack_double(value))
+
+        elif kind is list or kind is tuple:
+            if depth > MAX_DEPTH:
+                raise ValueError("Message nested too deeply")
+            append(T_LIST)
+            varint(len(value))
+            for item in value:
+                encode(item, depth + 1)
+
+        elif value is None:
+            append(T_NONE)
+
+        elif value is True:
+            append(T_TRUE)
+
+        elif value is False:
+            append(T_FALSE)
+
+        else:
+            raise TypeError(f"Cannot encode {kind.__name__}")
+
+    encode(msg, 0)
+    return bytes(out)
+
+
+def decode_binary(data: bytes) -> dict:
+    size = len(data)
+    strings = []
+    shapes = []
+    pos = 0
+    unpack_double = DOUBLE.unpack_from
+
+    def varint():
+        nonlocal pos
+        result = shift = 0
+
+        while True:
+            if pos >= size:
+                raise ValueError("Truncated message")
+            byte = data[pos]
+            pos += 1
+            result |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return result
+            shift += 7
+            if shift > 1024:
+                raise ValueError("Integer too long")
+
+    def take(length):
+        nonlocal pos
+        end = pos + length
+        if end > size:
+            raise ValueError("Truncated message")
+        raw = data[pos:end]
+        pos = end
+        return raw
+
+    def decode(depth):
+        nonlocal pos
+        if pos >= size:
+            raise ValueError("Truncated message")
+
+        tag = data[pos]
+        pos += 1
+
+        if tag == T_REF:
+            ref = varint()
+            if ref >= len(strings):
+                raise ValueError("Unknown string reference")
+            return strings[ref]
+
+        if tag == T_STR or tag == T_HEX or tag == T_HEX0X:
+            raw = take(varint())
+            if tag == T_STR:
+                value = raw.decode()
+            elif tag == T_HEX:
+                value = raw.hex()
+            else:
+                value = "0x" + raw.hex()
+
+            if len(value) <= INTERN_MAX:
+                strings.append(value)
+            return value
+
+        if tag == T_SHAPE or tag == T_DICT:
+            if depth > MAX_DEPTH:
+                raise ValueError("Message nested too deeply")
+
+            if tag == T_SHAPE:
+                ref = varint()
+                if ref >= len(shapes):
+                    raise ValueError("Unknown dict layout")
+                keys = shapes[ref]
+            else:
+                keys = tuple(decode(depth + 1) for _ in range(varint()))
+                if not all(type(key) is str for key in keys):
+                    raise ValueError("Non-string key")
+                shapes.append(keys)
+
+            return {key: decode(depth + 1) for key in keys}
+
+        if tag == T_INT:
+            n = varint()
+            return n >> 1 if not n & 1 else -((n + 1) >> 1)
+
+        if tag == T_FLOAT:
+            take(8)
+            return unpack_double(data, pos - 8)[0]
+
+        if tag == T_LIST:
+            if depth > MAX_DEPTH:
+                raise ValueError("Message nested too deeply")
+            return [decode(depth + 1) for _ in range(varint())]
+
+        if tag == T_NONE:
+            return None
+        if tag == T_TRUE:
+            return True
+        if tag == T_FALSE:
+            return False
+
+        raise ValueError(f"Unknown tag {tag}")
+
+    msg = decode(0)
+
+    if pos != size:
+        raise ValueError("Trailing bytes after message")
+    if not isinstance(msg, dict):
+        raise ValueError("Message is not an object")
+    return msg
+
+
+# --------------------
+# FRAMES
+# --------------------
+
+def encode_frame(msg: dict, features=frozenset()) -> bytes:
+    if not features:
+        raw = json.dumps(msg).encode()
+        return struct.pack(">I", len(raw)) + raw
+
+    flags = FLAG_MARKER
+
+    if "bin" in features and msg.get("type") in BINARY_TYPES:
+        body = encode_binary(msg)
+        flags |= FLAG_BINARY
+    else:
+        body = json.dumps(msg, separators=(",", ":")).encode()
+
+    if "zlib" in features and len(body) >= COMPRESS_MIN:
+        packed = zlib.compress(body, COMPRESS_LEVEL)
+        if len(packed) < len(body):
+            body = packed
+            flags |= FLAG_COMPRESSED
+
+    return struct.pack(">IB", len(body) + 1, flags) + body
+
+
+def inflate(body: bytes, max_size: int) -> bytes:
+    decompressor = zlib.decompressobj()
+    raw = decompressor.decompress(body, max_size)
+
+    if decompressor.unconsumed_tail:
+        raise ValueError(f"Message too large: over {max_size} bytes uncompressed")
+    return raw
+
+
+def decode_payload(payload: bytes, max_size: int) -> dict:
+    if not payload:
+        raise ValueError("Empty message")
+
+    flags = payload[0]
+
+    if not flags & FLAG_MARKER:
+        return json.loads(payload.decode())  # version 1
+
+    if flags & ~(FLAG_MARKER | FLAG_COMPRESSED | FLAG_BINARY):
+        raise ValueError(f"Unknown frame flags {flags:#x}")
+
+    body = payload[1:]
+    if flags & FLAG_COMPRESSED:
+        body = inflate(body, max_size)
+
+    if flags & FLAG_BINARY:
+        return decode_binary(body)
+
+    msg = json.loads(body.decode())
+    if not isinstance(msg, dict):
+        raise ValueError("Message is not an object")
+    return msg
@@ -1,5 +1,6 @@
 # main.py
 from datetime import datetime
+import argparse
 import hashlib
 import json
 import secrets
@@ -10,15 +11,20 @@ import uuid
 from core import genesis
 from core.block_validator import BlockValidator
 from core.tx_engine import TransactionEngine
+from core.sender_recovery import SenderRecovery
 from core.mempool import Mempool
+from core.block_builder import BlockTemplateBuilder
 from core.flare_source import FlareSource
 from core.transaction import Transaction
 from core.treasury import TreasuryEngine
 from core.block import Block
 from core.storage import ChainStorage
-from core.state import compute_balances, compute_spendable_balances
+from core.snapshot import SnapshotStore
+from core.checkpoint import CheckpointStore
+from core.state_db import StateDB
 from config.settings import  HOST_IP, HOST_PORT
 from core.network import P2PNetwork
+from core.loop_monitor import LoopMonitor
 from core.consensus import select_block_producer
 
 import asyncio
@@ -31,6 +37,7 @@ from core.validator_keystore import load_or_create_validator_key, pubkey_to_addr
 # -----------------------------
 SLOT_TOLERANCE = 5  # 5 second window to produce the block
 BLOCK_PROPAGATION_WAIT = 5  # seconds to wait to receive blocks from other nodes
+SNAPSHOT_CHECK_INTERVAL = 30  # seconds between state snapshot checks
 # -----------------------------
 
 PROTOCOL_SENDER = "_protocol"
@@ -61,16 +68,21 @@ def is_valid_block_time(block_slot, protocol):
     slot_end = slot_start + SLOT_TOLERANCE
     return slot_start <= current_time <= slot_end
 
+async def sleep_until(timestamp):
+    await asyncio.sleep(max(0, timestamp - time.time()))
+
 # -----------------------------
 # CHAIN Validation
 # -----------------------------
-def validate_chain(chain, validator):
-    for i, block in enumerate(chain):
-        prev = chain[i - 1] if i > 0 else None
-        chain_until_prev = chain[:i]
-        if not validator.validate(block, prev, chain_until_prev, mode="sync"):
-            return False
-    return True
+def validate_chain(chain, validator, trusted=None):
+    for progress in validator.iter_validate(chain, mode="sync", trusted=trusted):
+        if progress["done"]:
+            return progress["valid"]
+
+        print(
+            f"Validating chain: #{progress['index']}/{progress['total']} "
+            f"({progress['rate']:.0f} blocks/s, ETA {progress['eta']:.0f}s)"
+        )
 
 
 # -----------------------------
@@ -88,7 +100,7 @@ def bootstrap_validator():
 
 async def handle_reveal(
     parent_block,
-    parent_chain,
+    parent_balances,
     current_slot,
     tx_engine,
     user_txs,
@@ -127,11 +139,7 @@ async def handle_reveal(
     flare_cls = payload["class"]
     geomag_factor = payload["geomag"]
 
-    balances_before = await asyncio.to_thread(
-        compute_balances,
-        parent_chain,
-        protocol
-    )
+    balances_before = parent_balances
 
     treasury_address = protocol["treasury"]
     native_asset = protocol["native_asset"]
@@ -214,7 +222,7 @@ async def handle_commit(flare_source, current_slot):
 # -----------------------------
 
 
-async def main():
+async def main(full_verify=False):
     SIGNING_KEY, NODE_ADDRESS = bootstrap_validator()
 
     # Print logo
@@ -229,12 +237,14 @@ async def main():
 
 
     mempool = Mempool()
-    tx_engine = TransactionEngine()
+    tx_engine = TransactionEngine(recovery=SenderRecovery())
+    state_db = StateDB()
 
     validator = BlockValidator(
       validators=VALIDATORS,
       validator_pubkeys=VALIDATOR_PUBKEYS,
-      chain=chain
+      chain=chain,
+      state_db=state_db
     )
 
     # Initialize peers
@@ -244,7 +254,8 @@ async def main():
       chain,
       storage,
       validator,
-      mempool=mempool
+      mempool=mempool,
+      tx_engine=tx_engine
     )
 
     asyncio.create_task(p2p.connect_to_nodes(nodes))
@@ -261,9 +272,30 @@ async def main():
     # Generate genesis or skip
     genesis.generate(chain, p2p, storage)
 
+    checkpoints = CheckpointStore(storage.crypto)
+    trusted = None
+
+    # Restore tip state from the newest snapshot, replaying only later blocks
+    if chain:
+        snapshots = SnapshotStore(storage)
+
+        # Blocks below the sealed checkpoint were fully validated by this node
+        if not full_verify:
+            trusted = await asyncio.to_thread(
+                checkpoints.trusted, chain, snapshots, get_protocol(chain)
+            )
+            if trusted:
+                print(f"Trusted checkpoint at block #{trusted['index']}")
+
+        state, tip = await asyncio.to_thread(snapshots.restore, get_protocol(chain))
+        if tip >= 0:
+            state_db.load(state, tip, snapshots.cached[1])
+        state_db.sync(chain)
+        print(f"State restored up to block #{state_db.index}")
+
     # Verify chain integrity
-    if not validate_chain(chain, validator):
-      print("Blockchain is compromised, please clean ./data/chain.enc")
+    if not validate_chain(chain, validator, trusted):
+      print("Blockchain is compromised, please clean ./data/blocks")
       sys.exit(1)
     print("Blockchain is valid")
 
@@ -273,20 +305,53 @@ async def main():
 
     last_processed_slot = get_current_slot(protocol) - 1
 
+    mempool.set_protocol(protocol)
+    asyncio.create_task(mempool.run_persistence())
+    asyncio.create_task(mempool.run_expiry())
     asyncio.create_task(mempool_gossip_loop(p2p, mempool))
     asyncio.create_task(p2p.heartbeat())
+    asyncio.create_task(p2p.inv_loop())
+    asyncio.create_task(snapshot_loop(SnapshotStore(storage), checkpoints, protocol))
 
     flare_source = FlareSource(protocol)
 
+    def may_lead(parent_block, slot):
+        # primary or fallback leader
+        return MY_NODE_ID.lower() in (
+            select_block_producer(VALIDATORS, parent_block.hash, slot, attempt).lower()
+            for attempt in (0, 1)
+        )
+
+    builder = BlockTemplateBuilder(
+        chain,
+        state_db,
+        mempool,
+        tx_engine,
+        prepare_reveal=handle_reveal,
+        fetch_commit=lambda slot: handle_commit(flare_source, slot),
+        is_leader=may_lead,
+        tolerance=SLOT_TOLERANCE,
+        wait_for_chain=p2p.wait_for_chain_change
+    )
+    asyncio.create_task(builder.run(protocol))
+
     # -----------------------------
     # Loop
     # -----------------------------
+    # Wakes only at slot start, at the primary / fallback deadlines and
+    # when a block arrives (p2p.chain_changed), never by polling
+    wakeups = 0
+    cpu_mark = (time.process_time(), time.time())
+    # Probes only during a sync, where large frames are decoded
+    loop_monitor = LoopMonitor()
+    p2p.loop_monitor = loop_monitor
+
     while True:
-        await asyncio.sleep(0)
+        wakeups += 1
 
         if not chain:
             print("Chain is empty, waiting for genesis...")
-            await asyncio.sleep(1)
+            await p2p.wait_for_chain_change(1)
             continue
 
         protocol = get_protocol(chain)
@@ -294,15 +359,10 @@ async def main():
             raise ValueError("Missing protocol state")
         current_slot = get_current_slot(protocol)
 
-        if chain[-1].slot == current_slot:
-          last_processed_slot = current_slot
-          continue
-
-
-
-        # Skip if this slot was already processed
-        if current_slot == last_processed_slot:
-            await asyncio.sleep(1)
+        # Slot already has its block, or was handled: sleep to the next one
+        if chain[-1].slot >= current_slot or current_slot == last_processed_slot:
+            last_processed_slot = current_slot
+            await sleep_until(get_slot_start_time(current_slot + 1, protocol))
             continue
 
         # Calculate the waiting time until the next slot
@@ -319,31 +379,36 @@ async def main():
 
         # Verify that we are in the right time window
         if not is_valid_block_time(current_slot, protocol):
-            # If it's too late for this slot, wait for the next one
-            await asyncio.sleep(0.5)
+            # Too late for this slot, wait for the next one
+            last_processed_slot = current_slot
+            await sleep_until(get_slot_start_time(current_slot + 1, protocol))
             continue
 
         # Wait for sync to complete
         if p2p.syncing:
             print("Sync in progress, skipping slot...")
-            await asyncio.sleep(1)
+            await p2p.wait_for_chain_change(1)
             continue
 
         # Print the slot header
+        cpu_now = (time.process_time(), time.time())
+        idle_cpu = (cpu_now[0] - cpu_mark[0]) / max(cpu_now[1] - cpu_mark[1], 1e-9)
+        cpu_mark = cpu_now
+
         print(f"\n{'='*70}")
         print(f"SLOT #{current_slot} | {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        stalls = loop_monitor.take()
+        print(
+            f"Scheduler: {wakeups} wakeups since last slot, CPU {idle_cpu:.1%}, "
+            f"loop stall max {stalls['max_stall_ms']}ms ({stalls['stalls']} over "
+            f"{loop_monitor.threshold * 1000:.0f}ms, {stalls['probes']} probes while syncing)"
+        )
         print(f"{'='*70}")
-
-
-        if not chain:
-            print("Chain still empty after reload, waiting for sync...")
-            await asyncio.sleep(1)
-            continue
+        wakeups = 0
 
         # Extract solar data from the last block (deterministic)
 
         parent_block = chain[-1]
-        parent_chain = chain[:]   # snapshot before the new block
 
         # Select leader
         current_attempt = 0
@@ -359,15 +424,10 @@ async def main():
 
         # Not the leader for this slot
         if leader.lower() != MY_NODE_ID.lower():
-            current_time = time.time()
-            slot_start = get_slot_start_time(current_slot, protocol)
             slot_end = slot_start + SLOT_TOLERANCE
 
-            wait_time = max(0, slot_end - current_time)
-            if wait_time > 0:
-                await asyncio.sleep(wait_time)
-
-            if chain[-1].slot == current_slot:
+            # Returns as soon as the leader's block is appended
+            if await p2p.wait_for_slot_block(current_slot, slot_end):
                 last_processed_slot = current_slot
                 continue
 
@@ -385,13 +445,7 @@ async def main():
                 current_attempt = 1
             else:
                 slot_end_fallback = slot_start + SLOT_TOLERANCE * 2
-                wait_time = max(0, slot_end_fallback - time.time())
-                await asyncio.sleep(wait_time)
-
-                # Check if the block arrived during the wait
-                if chain[-1].slot == current_slot:
-                    last_processed_slot = current_slot
-                    continue
+                await p2p.wait_for_slot_block(current_slot, slot_end_fallback)
 
                 last_processed_slot = current_slot
                 continue
@@ -400,71 +454,27 @@ async def main():
         print("I am the leader for this slot!")
 
         # =====================================================
-        # 1. REVEAL PHASE (validates the previous block)
+        # 1-3. REVEAL PHASE + USER TXS (prebuilt template)
         # =====================================================
 
-        user_txs = mempool.load()
+        template, prebuilt = await builder.take(parent_block, current_slot, protocol)
 
-        system_txs, reveal_tx =  await handle_reveal(
-            parent_block,
-            parent_chain,
-            current_slot,
-            tx_engine,
-            user_txs,
-            protocol
-        )
-
-        # =====================================================
-        # 3. USER TX PROCESSING
-        # =====================================================
-
-        user_txs = mempool.load()
-        user_txs = sorted(user_txs, key=lambda x: x["txid"])
-
-        valid_user_txs = []
-        spendable_balances = compute_spendable_balances(parent_chain, [], protocol)
-        invalid_txids = set()
-
-        for i, tx in enumerate(user_txs):
-            if i % 10 == 0:
-                await asyncio.sleep(0)
-
-            if tx.get("action") == "flare_reveal":
-                continue  # validated in the reveal phase
-
-            try:
-                tx_engine.validate(tx, spendable_balances, protocol)
-
-                txc = dict(tx)
-
-                if txc["action"] == "transfer":
-                    txc["_fee"] = TransactionEngine.calculate_fee(txc["amount"], protocol)
-                else:
-                    txc["_fee"] = {
-                        "total": 0,
-                        "devs": 0,
-                        "orbital": 0,
-                        "validator": 0
-                    }
-
-                valid_user_txs.append(txc)
-
-                tx_engine.apply_tx(
-                    spendable_balances,
-                    txc,
-                    system=False,
-                    validator_address=None,
-                    protocol=protocol
-                )
+        if template is None or chain[-1].hash != parent_block.hash:
+            print("Chain advanced during the slot, skipping")
+            last_processed_slot = current_slot
+            continue
 
-            except ValueError as e:
-                print(f"DISCARDED: {e}")
-                invalid_txids.add(tx["txid"])
+        system_txs = list(template["system_txs"])
+        valid_user_txs = template["user_txs"]
+        invalid_txids = template["invalid_txids"]
+        spendable_balances = template["balances"]
 
-        if reveal_tx:
-            valid_user_txs.append(reveal_tx)
+        if prebuilt:
+            print(f"Template built {time.time() - template['built_at']:.1f}s ago")
 
         print(f"Processed TX: {len(valid_user_txs)} user + {len(system_txs)} system")
+        print(f"Sender cache: {tx_engine.recovery.stats()}")
+        print(f"Mempool: {mempool.stats()}")
 
         # =====================================================
         # 4. FEES
@@ -509,10 +519,7 @@ async def main():
         flare_commit = None
         new_reveal = None
 
-        flare_commit, new_reveal = await handle_commit(
-            flare_source,
-            current_slot
-        )
+        flare_commit, new_reveal = await builder.take_commit(current_slot)
 
         block = Block(
             index=len(chain),
@@ -529,29 +536,32 @@ async def main():
         ).signature.hex()
 
         chain.append(block)
-        await asyncio.to_thread(storage.save, chain)
+        p2p.chain_changed()
 
         # =====================================================
-        # 6. CLEAN MEMPOOL
+        # 6. BROADCAST
         # =====================================================
 
-        included_txids = {tx["txid"] for tx in valid_user_txs}
-        mempool.remove_many(included_txids | invalid_txids)
+        await p2p.broadcast_block(block)
 
-        print(f"Block #{block.index} created")
+        latency = time.time() - get_slot_start_time(current_slot, protocol)
+        print(
+            f"Block #{block.index} sent to P2P network "
+            f"{latency:.3f}s after slot start ({'prebuilt' if prebuilt else 'built inline'})"
+        )
         print(f"   Hash: {block.hash[:16]}...")
         print("="*70)
 
+        # Persisted after broadcast: if the node dies in between, the
+        # block is recovered from peers on restart
+        await asyncio.to_thread(storage.save, chain)
+
         # =====================================================
-        # 7. BROADCAST
+        # 7. CLEAN MEMPOOL
         # =====================================================
 
-        await p2p.broadcast({
-            "type": "block",
-            "data": block.to_dict()
-        })
-
-        print("Block sent to P2P network")
+        included_txids = {tx["txid"] for tx in valid_user_txs}
+        mempool.remove_many(included_txids | invalid_txids)
 
         # After broadcasting the block
         if new_reveal and flare_commit:
@@ -571,7 +581,8 @@ async def main():
                 canonical_json(reveal_tx)
             ).signature.hex()
 
-            mempool.add(reveal_tx)
+            # our own block is the tip, so the reveal is the one it needs
+            mempool.add(reveal_tx, verified=True)
 
             await p2p.broadcast({
                 "type": "tx",
@@ -582,7 +593,6 @@ async def main():
 
 
         last_processed_slot = current_slot
-        await asyncio.sleep(1)
 
 async def mempool_gossip_loop(p2p, mempool):
     seen = set()
@@ -598,10 +608,8 @@ async def mempool_gossip_loop(p2p, mempool):
 
                 seen.add(txid)
 
-                await p2p.broadcast({
-                    "type": "tx",
-                    "data": tx
-                })
+                # Peers that lack it fetch the body (inv / getdata)
+                p2p.announce(txid)
 
             if len(seen) > 10_000:
                 seen.clear()
@@ -612,6 +620,31 @@ async def mempool_gossip_loop(p2p, mempool):
             print("GOSSIP LOOP CRASHED:", e)
             await asyncio.sleep(1)
 
+async def snapshot_loop(snapshots, checkpoints, protocol):
+    # Snapshots are built from storage in a worker thread,
+    # so slot production never waits on them
+    while True:
+        try:
+            snapshot = await asyncio.to_thread(snapshots.checkpoint, protocol)
+            if snapshot is not None:
+                index, block_hash, state = snapshot
+                # Every stored block was validated before being appended
+                checkpoints.seal(index, block_hash, state)
+                print(f"State snapshot and checkpoint written at block #{index}")
+
+        except Exception as e:
+            print("SNAPSHOT LOOP CRASHED:", e)
+
+        await asyncio.sleep(SNAPSHOT_CHECK_INTERVAL)
+
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Argh Chain node")
+    parser.add_argument(
+        "--full-verify",
+        action="store_true",
+        help="ignore the local checkpoint and fully re-validate every block"
+    )
+    args = parser.parse_args()
+
+    asyncio.run(main(full_verify=args.full_verify))
\ No newline at end of file